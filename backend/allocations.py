@@ -0,0 +1,155 @@
+import asyncio
+import inspect
+import os
+import tracemalloc
+import uuid
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+# Frames kept per allocation; deep enough to reach the route handler from
+# inside pydantic, orjson or the driver
+TRACEMALLOC_FRAMES = int(os.environ.get("TRACEMALLOC_FRAMES", 25))
+# Snapshots held for diffing, oldest dropped first
+MEMORY_SNAPSHOTS_KEEP = int(os.environ.get("MEMORY_SNAPSHOTS_KEEP", 5))
+
+GROUPINGS = ("route", "lineno", "filename", "traceback")
+_IGNORED = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+]
+
+
+def handler_lines(routes) -> Dict[str, List[Tuple[int, int, str]]]:
+    """filename -> (first line, last line, "METHOD /path") of every route handler"""
+    handlers = defaultdict(list)
+    for route in routes:
+        endpoint = getattr(route, "endpoint", None)
+        # FastJSONRoute wraps every handler; charge the handler, not the wrapper
+        code = getattr(inspect.unwrap(endpoint), "__code__", None) if endpoint is not None else None
+        if code is None:
+            continue
+        lines = [line for _, _, line in code.co_lines() if line is not None]
+        label = f"{','.join(sorted(getattr(route, 'methods', None) or ['WS']))} {route.path}"
+        handlers[code.co_filename].append((min(lines), max(lines), label))
+    return handlers
+
+
+def route_of(traceback: tracemalloc.Traceback, handlers: Dict) -> str:
+    """The handler an allocation was made under, or the file that made it"""
+    for frame in traceback:
+        for first, last, label in handlers.get(frame.filename, ()):
+            if first <= frame.lineno <= last:
+                return label
+    # Outside any handler: response encoding, middleware, driver threads
+    return f"(no route) {os.path.basename(traceback[-1].filename)}" if len(traceback) else "(no route)"
+
+
+def group_by_route(snapshot: tracemalloc.Snapshot, handlers: Dict) -> Dict[str, List[int]]:
+    groups: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    labels: Dict[tracemalloc.Traceback, str] = {}
+    for trace in snapshot.traces:
+        label = labels.get(trace.traceback)
+        if label is None:
+            label = labels[trace.traceback] = route_of(trace.traceback, handlers)
+        group = groups[label]
+        group[0] += trace.size
+        group[1] += 1
+    return groups
+
+
+def _where(traceback: tracemalloc.Traceback, group_by: str) -> str:
+    if group_by == "filename":
+        return traceback[-1].filename
+    # Most recent frame first, like the lineno grouping's single frame
+    return "\n".join(str(frame) for frame in reversed(traceback))
+
+
+class MemorySnapshots:
+    """
+    tracemalloc snapshots taken on demand by admins. Tracing starts with the
+    first snapshot and slows allocation while on, so stop() it when done.
+    """
+
+    def __init__(self):
+        self.snapshots: "OrderedDict[str, Tuple[datetime, tracemalloc.Snapshot]]" = OrderedDict()
+
+    async def take(self) -> Dict:
+        # Copying every trace takes a while on a big heap
+        return await asyncio.to_thread(self._take)
+
+    def _take(self) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        snapshot_id = str(uuid.uuid4())
+        taken_at = datetime.utcnow()
+        self.snapshots[snapshot_id] = (taken_at, snapshot)
+        while len(self.snapshots) > MEMORY_SNAPSHOTS_KEEP:
+            self.snapshots.popitem(last=False)
+        current, peak = tracemalloc.get_traced_memory()
+        return {"id": snapshot_id, "taken_at": taken_at, "traced_bytes": current, "peak_bytes": peak}
+
+    def stop(self) -> Dict:
+        was_tracing = tracemalloc.is_tracing()
+        tracemalloc.stop()
+        self.snapshots.clear()
+        return {"stopped": was_tracing}
+
+    def get(self, snapshot_id: str) -> tracemalloc.Snapshot:
+        entry = self.snapshots.get(snapshot_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        return entry[1]
+
+    async def diff(self, base_id: str, target_id: Optional[str], routes,
+                   group_by: str = "route", limit: int = 20) -> Dict:
+        """What was allocated and still alive at target but not at base, largest first"""
+        if group_by not in GROUPINGS:
+            raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUPINGS)}")
+        base = self.get(base_id)
+        if target_id is None:
+            target_id = (await self.take())["id"]
+        target = self.get(target_id)
+        # Grouping walks every live allocation; keep it off the event loop
+        rows = await asyncio.to_thread(self._diff, base, target, routes, group_by)
+        rows.sort(key=lambda row: abs(row["size_diff"]), reverse=True)
+        return {
+            "base": base_id,
+            "target": target_id,
+            "group_by": group_by,
+            "size_diff": sum(row["size_diff"] for row in rows),
+            "groups": rows[:limit],
+        }
+
+    @staticmethod
+    def _diff(base, target, routes, group_by: str) -> List[Dict]:
+        if group_by != "route":
+            return [{
+                "where": _where(stat.traceback, group_by),
+                "size": stat.size,
+                "size_diff": stat.size_diff,
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            } for stat in target.compare_to(base, group_by)]
+
+        handlers = handler_lines(routes)
+        before = group_by_route(base, handlers)
+        after = group_by_route(target, handlers)
+        rows = []
+        for label in set(before) | set(after):
+            size, count = after.get(label, (0, 0))
+            base_size, base_count = before.get(label, (0, 0))
+            rows.append({
+                "where": label,
+                "size": size,
+                "size_diff": size - base_size,
+                "count": count,
+                "count_diff": count - base_count,
+            })
+        return rows
+
+
+memory_snapshots = MemorySnapshots()
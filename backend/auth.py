@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import jwt
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+JWT_ALGORITHM = "HS256"
+ACCESS_TOKEN_TTL_SECONDS = int(os.environ.get("ACCESS_TOKEN_TTL_SECONDS", 3600))
+# How often each worker pulls revocations written by other workers
+REVOCATION_POLL_SECONDS = float(os.environ.get("REVOCATION_POLL_SECONDS", 5))
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", 10000))
+
+JWT_SECRET = os.environ.get("JWT_SECRET")
+if not JWT_SECRET:
+    # Tokens from one worker will not verify on another; set JWT_SECRET in production
+    JWT_SECRET = secrets.token_urlsafe(32)
+    logger.warning("JWT_SECRET not set, using a per-process secret")
+
+# token -> verified claims, oldest first
+_verified: "OrderedDict[str, Dict]" = OrderedDict()
+# user_id -> unix time; tokens issued at or before it are rejected
+_revoked: Dict[str, float] = {}
+_last_poll = 0.0
+
+
+def create_access_token(user: Dict) -> str:
+    """Sign a token carrying the caller's id, role and name"""
+    now = time.time()
+    claims = {
+        "sub": user["id"],
+        "role": user["role"],
+        "name": user["name"],
+        "iat": now,
+        "exp": int(now + ACCESS_TOKEN_TTL_SECONDS),
+    }
+    return jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def _is_revoked(claims: Dict) -> bool:
+    revoked_at = _revoked.get(claims["sub"])
+    return revoked_at is not None and claims["iat"] <= revoked_at
+
+
+def verify_access_token(token: str) -> Optional[Dict]:
+    """
+    Return the token's claims, or None if it is invalid, expired or revoked.
+    Signature checks are cached so repeat requests cost a dict lookup.
+    """
+    claims = _verified.get(token)
+    if claims is not None:
+        if claims["exp"] <= time.time():
+            del _verified[token]
+            return None
+        _verified.move_to_end(token)
+    else:
+        try:
+            claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.InvalidTokenError:
+            return None
+        _verified[token] = claims
+        if len(_verified) > TOKEN_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+    if _is_revoked(claims):
+        return None
+    return claims
+
+
+async def revoke_user_sessions(db, user_id: str):
+    """Invalidate every token issued to user_id so far, on all workers"""
+    revoked_at = time.time()
+    _revoked[user_id] = revoked_at
+    await db.session_revocations.update_one(
+        {"user_id": user_id},
+        {"$set": {"revoked_at": revoked_at, "created_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+async def ensure_revocation_index(db):
+    # Revocations only need to outlive the tokens they cancel
+    await db.session_revocations.create_index("created_at", expireAfterSeconds=ACCESS_TOKEN_TTL_SECONDS)
+    await db.session_revocations.create_index("user_id", unique=True)
+
+
+async def sync_revocations(db):
+    """Load revocations written by other workers since the last poll"""
+    global _last_poll
+    since = datetime.utcnow() - timedelta(seconds=ACCESS_TOKEN_TTL_SECONDS)
+    if _last_poll:
+        since = max(since, datetime.utcfromtimestamp(_last_poll) - timedelta(seconds=REVOCATION_POLL_SECONDS))
+    _last_poll = time.time()
+    async for doc in db.session_revocations.find({"created_at": {"$gte": since}}, {"_id": 0}):
+        if doc["revoked_at"] > _revoked.get(doc["user_id"], 0):
+            _revoked[doc["user_id"]] = doc["revoked_at"]
+
+    # Forget revocations older than any token that could still be live
+    cutoff = time.time() - ACCESS_TOKEN_TTL_SECONDS
+    for user_id in [u for u, t in _revoked.items() if t < cutoff]:
+        del _revoked[user_id]
+
+
+async def poll_revocations(db):
+    while True:
+        try:
+            await sync_revocations(db)
+        except Exception as e:
+            logger.error("Revocation sync failed: %s", e, extra={"error": str(e)})
+        await asyncio.sleep(REVOCATION_POLL_SECONDS)
+
+
+def get_current_user(request: Request) -> Optional[Dict]:
+    """
+    Dependency returning the caller's claims from a Bearer token, or None
+    for anonymous requests. An invalid token is rejected with 401.
+    """
+    header = request.headers.get("Authorization")
+    if not header or not header.startswith("Bearer "):
+        return None
+    claims = verify_access_token(header[len("Bearer "):])
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return claims
+
+
+def require_admin(caller: Optional[Dict]):
+    """Reject anonymous callers and anyone whose token is not an admin's"""
+    if caller is None:
+        raise HTTPException(status_code=401, detail="Admin token required")
+    if caller["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def check_caller(caller: Optional[Dict], user_id: str):
+    """
+    Reject anonymous requests and those whose token belongs to someone other
+    than user_id. Without a token the user_id in the request would be taken
+    on trust, and deactivation could be sidestepped by dropping the header.
+    """
+    if caller is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    if caller["sub"] != user_id and caller["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Token does not match user")
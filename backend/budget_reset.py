@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from ledger import LEDGER_SNAPSHOT_EVERY, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Zone used for pros that have not set pro_profiles.time_zone
+DEFAULT_TIME_ZONE = os.environ.get("DEFAULT_TIME_ZONE", "America/Chicago")
+# Profiles updated per bulk_write; each batch is short so concurrent quote
+# submissions on the same profiles never wait long
+BUDGET_RESET_BATCH_SIZE = int(os.environ.get("BUDGET_RESET_BATCH_SIZE", 1000))
+BUDGET_RESET_INTERVAL_SECONDS = float(os.environ.get("BUDGET_RESET_INTERVAL_SECONDS", 300))
+
+_DUE_PROJECTION = {"user_id": 1, "weekly_budget": 1, "weekly_spent": 1, "ledger_seq": 1}
+
+
+def week_start(zone: str, now: datetime) -> datetime:
+    """Start of the current week (Monday 00:00 local) as a naive UTC datetime"""
+    try:
+        tz = ZoneInfo(zone)
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo(DEFAULT_TIME_ZONE)
+    local = now.replace(tzinfo=timezone.utc).astimezone(tz)
+    monday = (local - timedelta(days=local.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return monday.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+async def ensure_budget_reset_indexes(db):
+    await db.pro_profiles.create_index([("time_zone", 1), ("budget_week_start", 1)])
+    await db.pro_profiles.create_index(
+        "last_reset.recorded", partialFilterExpression={"last_reset.recorded": False}
+    )
+
+
+async def record_resets(db, query: Dict) -> int:
+    """
+    Write the ledger entries for resets already applied to profiles. Safe
+    to repeat: entries are keyed by (pro_id, seq), and only profiles still
+    flagged unrecorded are picked up.
+    """
+    profiles = await db.pro_profiles.find(
+        {**query, "last_reset.recorded": False}, {"_id": 0, "user_id": 1, "last_reset": 1}
+    ).to_list(None)
+    if not profiles:
+        return 0
+    now = datetime.utcnow()
+    entries = [{
+        "id": str(uuid.uuid4()),
+        "pro_id": p["user_id"],
+        "seq": p["last_reset"]["seq"],
+        "kind": "weekly_reset",
+        "ref": p["last_reset"]["week_start"].isoformat(),
+        "budget_delta": 0.0,
+        "spent_delta": -p["last_reset"]["spent"],
+        "weekly_budget": p["last_reset"]["weekly_budget"],
+        "weekly_spent": 0.0,
+        "created_at": now,
+    } for p in profiles]
+    try:
+        await db.credit_ledger.insert_many(entries, ordered=False)
+    except BulkWriteError as e:
+        # Entries written before a crash are duplicates now; anything else is real
+        if any(err["code"] != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    pro_ids = [p["user_id"] for p in profiles]
+    await db.pro_profiles.update_many(
+        {"user_id": {"$in": pro_ids}, "last_reset.recorded": False},
+        {"$set": {"last_reset.recorded": True}}
+    )
+    for entry in entries:
+        if entry["seq"] % LEDGER_SNAPSHOT_EVERY == 0:
+            await write_snapshot(db, entry["pro_id"], entry["seq"])
+    return len(entries)
+
+
+async def _reset_batch(db, batch: List[Dict], start: datetime) -> int:
+    requests = []
+    for profile in batch:
+        seq = profile.get("ledger_seq", 0)
+        requests.append(UpdateOne(
+            # Matching on ledger_seq skips pros whose balance moved since the
+            # batch was read; they are picked up again on the next pass
+            {"_id": profile["_id"], "ledger_seq": seq},
+            {
+                "$set": {
+                    "weekly_spent": 0.0,
+                    "budget_week_start": start,
+                    "ledger_seq": seq + 1,
+                    "last_reset": {
+                        "seq": seq + 1,
+                        "spent": profile.get("weekly_spent", 0.0),
+                        "weekly_budget": profile.get("weekly_budget", 0.0),
+                        "week_start": start,
+                        "recorded": False,
+                    },
+                },
+            }
+        ))
+    result = await db.pro_profiles.bulk_write(requests, ordered=False)
+    await record_resets(db, {"_id": {"$in": [p["_id"] for p in batch]}})
+    return result.modified_count
+
+
+async def reset_zone(db, zone: str, now: datetime) -> int:
+    start = week_start(zone, now)
+    zone_filter = {"$in": [zone, None]} if zone == DEFAULT_TIME_ZONE else zone
+    query = {
+        "time_zone": zone_filter,
+        "$or": [{"budget_week_start": {"$lt": start}}, {"budget_week_start": {"$exists": False}}],
+    }
+    reset = 0
+    last_id = None
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+        batch = await db.pro_profiles.find(page, _DUE_PROJECTION).sort("_id", 1).limit(BUDGET_RESET_BATCH_SIZE).to_list(None)
+        if not batch:
+            return reset
+        reset += await _reset_batch(db, batch, start)
+        last_id = batch[-1]["_id"]
+        # Let request handlers run between batches
+        await asyncio.sleep(0)
+
+
+async def reset_weekly_budgets(db, now: datetime = None) -> Dict[str, int]:
+    """
+    Zero weekly_spent for every pro whose local week has rolled over since
+    their last reset, one time zone at a time. Each reset is a conditional
+    update plus a weekly_reset ledger entry, so the run can be interrupted
+    and repeated (by any worker) without double-resetting or losing entries.
+    """
+    now = now or datetime.utcnow()
+    # Finish recording resets from a run that crashed part-way
+    await record_resets(db, {})
+    zones = {DEFAULT_TIME_ZONE} | {z for z in await db.pro_profiles.distinct("time_zone") if z}
+    results = {}
+    for zone in sorted(zones):
+        count = await reset_zone(db, zone, now)
+        if count:
+            results[zone] = count
+    if results:
+        logger.info("Weekly budget reset: %s", results,
+                    extra={"zones": results, "pros_reset": sum(results.values())})
+    return results
+
+
+async def run_budget_resets(db, on_reset: Optional[Callable] = None):
+    while True:
+        try:
+            if await reset_weekly_budgets(db) and on_reset is not None:
+                await on_reset()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Weekly budget reset failed: %s", e, extra={"error": str(e)})
+        await asyncio.sleep(BUDGET_RESET_INTERVAL_SECONDS)
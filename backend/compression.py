@@ -0,0 +1,161 @@
+import asyncio
+import gzip
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Bodies smaller than this are sent as-is; the headers would eat the savings
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+# Bodies at least this large are compressed on a worker thread
+COMPRESSION_OFFLOAD_SIZE = int(os.environ.get("COMPRESSION_OFFLOAD_SIZE", 64 * 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+
+COMPRESSIBLE_TYPES = (
+    "application/json", "application/x-ndjson", "text/", "application/javascript",
+    "application/xml",
+)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionStats:
+    def __init__(self):
+        self.routes: Dict[str, Dict] = defaultdict(lambda: {
+            "responses": 0,
+            "compressed": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "cpu_seconds": 0.0,
+        })
+
+    def record(self, route: str, bytes_in: int, bytes_out: int, cpu_seconds: float = 0.0):
+        stats = self.routes[route]
+        stats["responses"] += 1
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        if cpu_seconds:
+            stats["compressed"] += 1
+            stats["cpu_seconds"] += cpu_seconds
+
+    def snapshot(self) -> Dict:
+        result = {}
+        for route, stats in self.routes.items():
+            saved = stats["bytes_in"] - stats["bytes_out"]
+            result[route] = {
+                **stats,
+                "bytes_saved": saved,
+                "bytes_saved_per_cpu_ms": round(saved / (stats["cpu_seconds"] * 1000), 1) if stats["cpu_seconds"] else None,
+            }
+        return result
+
+
+compression_stats = CompressionStats()
+
+
+def _timed_compress(body: bytes, encoding: str):
+    start = time.perf_counter()
+    compressed = compress(body, encoding)
+    return compressed, time.perf_counter() - start
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete response bodies with br or gzip, based on the
+    client's Accept-Encoding. Streaming responses (more_body) are passed
+    through untouched so exports and event streams are not buffered.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            route = scope.get("route")
+            # Unmatched paths share one bucket so random URLs cannot grow the stats
+            route_path = route.path if route is not None else "unmatched"
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+
+            if (
+                message.get("more_body")
+                or encoding is None
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+                or len(body) < COMPRESSION_MIN_SIZE
+            ):
+                if not message.get("more_body"):
+                    compression_stats.record(route_path, len(body), len(body))
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESSION_OFFLOAD_SIZE:
+                loop = asyncio.get_running_loop()
+                compressed, cpu = await loop.run_in_executor(None, _timed_compress, body, encoding)
+            else:
+                compressed, cpu = _timed_compress(body, encoding)
+            compression_stats.record(route_path, len(body), len(compressed), cpu)
+
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,88 @@
+import logging
+import os
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+# Send X-DB-Calls / X-DB-Time-Ms on every response (development and tests)
+DB_CALL_HEADERS = os.environ.get("DB_CALL_HEADERS", "false").lower() == "true"
+# Round trips a request may make before it is logged as over budget
+DEFAULT_DB_CALL_BUDGET = int(os.environ.get("DB_CALL_BUDGET", 10))
+
+# "METHOD /route/template" -> budget, for routes that legitimately need more
+ROUTE_DB_CALL_BUDGETS: Dict[str, int] = {
+    # Every 50th ledger entry also writes a balance snapshot
+    "POST /api/quotes": 12,
+    # One getMore per EXPORT_CHUNK_ROWS rows
+    "GET /api/admin/export/{collection}": 100_000,
+}
+
+# Durations (microseconds) of the commands issued by the current request.
+# Motor copies the context onto its executor threads, and list.append is
+# atomic, so concurrent commands within one request are all counted.
+request_db_calls: ContextVar[Optional[List[int]]] = ContextVar("request_db_calls", default=None)
+
+
+class DBCallCounter(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        calls = request_db_calls.get()
+        if calls is not None:
+            calls.append(event.duration_micros)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+db_call_counter = DBCallCounter()
+
+
+def db_call_budget(route: str) -> int:
+    return ROUTE_DB_CALL_BUDGETS.get(route, DEFAULT_DB_CALL_BUDGET)
+
+
+class DBCallMiddleware:
+    """
+    Counts the Mongo round trips and time each request spends in them.
+    Requests over their route's budget are logged, which is how N+1 loops
+    (a find_one per row) show up. With DB_CALL_HEADERS the totals are also
+    returned as response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        calls: List[int] = []
+        token = request_db_calls.set(calls)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and DB_CALL_HEADERS:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Calls"] = str(len(calls))
+                headers["X-DB-Time-Ms"] = f"{sum(calls) / 1000:.1f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_db_calls.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                name = f"{scope['method']} {route.path}"
+                if len(calls) > db_call_budget(name):
+                    logger.warning(
+                        "%s made %d database calls (%.1fms), budget %d",
+                        name, len(calls), sum(calls) / 1000, db_call_budget(name),
+                        extra={"route": name, "db_calls": len(calls), "db_time_ms": sum(calls) / 1000}
+                    )
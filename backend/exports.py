@@ -0,0 +1,90 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from responses import dumps
+
+# Rows per chunk written to the response; bounds memory per export
+EXPORT_CHUNK_ROWS = 500
+
+# collection name in the URL -> (Mongo collection, CSV columns)
+EXPORTS: Dict[str, tuple] = {
+    "users": ("users", [
+        "id", "email", "name", "phone", "role", "is_active", "created_at",
+    ]),
+    "payments": ("payments", [
+        "id", "pro_id", "amount", "payment_type", "job_id", "status", "created_at",
+    ]),
+    "transactions": ("payment_transactions", [
+        "id", "session_id", "pro_id", "package_id", "amount", "credits", "currency",
+        "payment_type", "payment_method", "payment_status", "status", "created_at",
+        "updated_at",
+    ]),
+}
+
+# Never exported
+EXCLUDED_FIELDS = {"password": 0}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def build_export_query(
+    created_after: Optional[datetime],
+    created_before: Optional[datetime],
+    cursor: Optional[str]
+) -> Dict:
+    query = {}
+    if created_after or created_before:
+        query["created_at"] = {}
+        if created_after:
+            query["created_at"]["$gte"] = created_after
+        if created_before:
+            query["created_at"]["$lt"] = created_before
+    if cursor:
+        if not ObjectId.is_valid(cursor):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query["_id"] = {"$gt": ObjectId(cursor)}
+    return query
+
+
+def _csv_chunk(rows: List[Dict], columns: List[str], header: bool) -> bytes:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    if header:
+        writer.writerow(columns + ["cursor"])
+    for row in rows:
+        values = []
+        for col in columns:
+            value = row.get(col)
+            values.append(value.isoformat() if isinstance(value, datetime) else value)
+        writer.writerow(values + [row["cursor"]])
+    return out.getvalue().encode("utf-8")
+
+
+def _ndjson_chunk(rows: List[Dict]) -> bytes:
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+async def stream_export(db, name: str, fmt: str, query: Dict) -> AsyncIterator[bytes]:
+    """
+    Yield the export in chunks of EXPORT_CHUNK_ROWS rows, in _id order.
+    Every row carries a cursor; passing the last one received as ?cursor=
+    resumes the export after that row.
+    """
+    collection, columns = EXPORTS[name]
+    cursor = db[collection].find(query, EXCLUDED_FIELDS).sort("_id", 1).batch_size(EXPORT_CHUNK_ROWS)
+    rows = []
+    first_chunk = True
+    async for doc in cursor:
+        doc["cursor"] = str(doc.pop("_id"))
+        rows.append(doc)
+        if len(rows) >= EXPORT_CHUNK_ROWS:
+            yield _csv_chunk(rows, columns, first_chunk) if fmt == "csv" else _ndjson_chunk(rows)
+            first_chunk = False
+            rows = []
+    if rows or (first_chunk and fmt == "csv"):
+        yield _csv_chunk(rows, columns, first_chunk) if fmt == "csv" else _ndjson_chunk(rows)
@@ -0,0 +1,164 @@
+import heapq
+import math
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+# Fields loaded from pro_profiles to build an index entry
+INDEX_PROJECTION = {
+    "_id": 0, "user_id": 1, "services": 1, "service_areas": 1, "rating": 1,
+    "weekly_budget": 1, "weekly_spent": 1, "budget_active": 1,
+    "last_active_at": 1, "created_at": 1,
+}
+
+# Ranking weights; each component is normalised to 0..1
+RATING_WEIGHT = 0.5
+BUDGET_WEIGHT = 0.3
+RECENCY_WEIGHT = 0.2
+# Remaining budget at which the budget component saturates
+BUDGET_SATURATION = 100.0
+# Recency component halves every this many days of inactivity
+RECENCY_HALF_LIFE_DAYS = 7.0
+
+
+def area_tokens(value: str) -> Set[str]:
+    """
+    Normalised tokens for a service area or job location, so "Austin, TX",
+    "austin" and "78701" style entries can be compared by set intersection.
+    """
+    value = (value or "").strip().lower()
+    if not value:
+        return set()
+    tokens = {value}
+    city = value.split(",")[0].strip()
+    if city:
+        tokens.add(city)
+    return tokens
+
+
+def job_area_tokens(job: Dict) -> Set[str]:
+    return area_tokens(job.get("location", "")) | area_tokens(job.get("zipcode", ""))
+
+
+class ProEntry:
+    __slots__ = ("pro_id", "keys", "rating", "remaining", "active", "last_active")
+
+    def __init__(self, pro_id: str):
+        self.pro_id = pro_id
+        self.keys: Set[Tuple[str, str]] = set()
+        self.rating = 0.0
+        self.remaining = 0.0
+        self.active = False
+        self.last_active = 0.0
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        # Mongo returns naive UTC datetimes
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+class LeadIndex:
+    """
+    Inverted index from (category, area token) to pro ids, covering every
+    pro. Answers "who should see this job" by a union of a few posting sets
+    followed by a top-k ranking over the candidates, without touching Mongo.
+    """
+
+    def __init__(self):
+        self.postings: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        self.pros: Dict[str, ProEntry] = {}
+
+    def __len__(self):
+        return len(self.pros)
+
+    def upsert(self, profile: Dict):
+        pro_id = profile["user_id"]
+        entry = self.pros.get(pro_id)
+        if entry is None:
+            entry = self.pros[pro_id] = ProEntry(pro_id)
+
+        tokens = set()
+        for area in profile.get("service_areas") or []:
+            tokens |= area_tokens(area)
+        keys = {(category, token) for category in profile.get("services") or [] for token in tokens}
+        for key in entry.keys - keys:
+            self._remove_posting(key, pro_id)
+        for key in keys - entry.keys:
+            self.postings[key].add(pro_id)
+        entry.keys = keys
+
+        entry.rating = float(profile.get("rating") or 0.0)
+        entry.remaining = float(profile.get("weekly_budget") or 0.0) - float(profile.get("weekly_spent") or 0.0)
+        entry.active = bool(profile.get("budget_active", True))
+        entry.last_active = _timestamp(profile.get("last_active_at") or profile.get("created_at"))
+
+    def remove(self, pro_id: str):
+        entry = self.pros.pop(pro_id, None)
+        if entry is not None:
+            for key in entry.keys:
+                self._remove_posting(key, pro_id)
+
+    def _remove_posting(self, key: Tuple[str, str], pro_id: str):
+        pros = self.postings.get(key)
+        if pros is not None:
+            pros.discard(pro_id)
+            if not pros:
+                del self.postings[key]
+
+    def candidates(self, category: str, tokens: Set[str]) -> Set[str]:
+        found: Set[str] = set()
+        for token in tokens:
+            pros = self.postings.get((category, token))
+            if pros:
+                found |= pros
+        return found
+
+    def score(self, entry: ProEntry, now: float) -> float:
+        age_days = max(0.0, now - entry.last_active) / 86400
+        return (
+            RATING_WEIGHT * min(entry.rating / 5.0, 1.0)
+            + BUDGET_WEIGHT * min(entry.remaining / BUDGET_SATURATION, 1.0)
+            + RECENCY_WEIGHT * math.pow(0.5, age_days / RECENCY_HALF_LIFE_DAYS)
+        )
+
+    def match(self, job: Dict, lead_fee: float, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Budget-eligible pros for a job as (pro_id, score), best first"""
+        now = time.time()
+        scored = []
+        for pro_id in self.candidates(job.get("category"), job_area_tokens(job)):
+            entry = self.pros[pro_id]
+            if entry.active and entry.remaining >= lead_fee:
+                scored.append((self.score(entry, now), pro_id))
+        if limit is not None:
+            scored = heapq.nlargest(limit, scored)
+        else:
+            scored.sort(reverse=True)
+        return [(pro_id, round(score, 4)) for score, pro_id in scored]
+
+    def stats(self) -> Dict:
+        return {"pros": len(self.pros), "postings": len(self.postings)}
+
+
+async def load_index(db, index: LeadIndex):
+    async for profile in db.pro_profiles.find({}, INDEX_PROJECTION).batch_size(5000):
+        index.upsert(profile)
+
+
+async def refresh_pro(db, index: LeadIndex, pro_id: str):
+    """Re-read one pro's indexed fields after a local write"""
+    profile = await db.pro_profiles.find_one({"user_id": pro_id}, INDEX_PROJECTION)
+    if profile:
+        index.upsert(profile)
+    else:
+        index.remove(pro_id)
+
+
+lead_index = LeadIndex()
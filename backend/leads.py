@@ -0,0 +1,66 @@
+import logging
+from typing import Dict, Set
+
+from lead_index import lead_index
+from realtime import pubsub, Subscriber
+
+logger = logging.getLogger(__name__)
+
+
+class LeadMatcher:
+    """
+    Pushes newly posted jobs to the pros connected to this worker. Matching
+    and ranking come from the in-memory lead index; budget eligibility of
+    the connected matches is confirmed against the database at dispatch
+    time, since other workers may have charged the pro since the index
+    last saw it.
+    """
+
+    def __init__(self):
+        self.connected: Dict[str, Set[Subscriber]] = {}
+        self.jobs_matched = 0
+        self.leads_sent = 0
+
+    def connect(self, pro_id: str) -> Subscriber:
+        subscriber = pubsub.subscribe(f"leads:{pro_id}", "leads")
+        self.connected.setdefault(pro_id, set()).add(subscriber)
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        pro_id = subscriber.topic.split(":", 1)[1]
+        connections = self.connected.get(pro_id)
+        if connections is not None:
+            connections.discard(subscriber)
+            if not connections:
+                del self.connected[pro_id]
+
+    async def dispatch(self, db, job: Dict, lead: Dict, lead_fee: float):
+        """Push a lead to every matching, budget-active pro connected here"""
+        if not self.connected:
+            return
+        pro_ids = [pro_id for pro_id, _ in lead_index.match(job, lead_fee) if pro_id in self.connected]
+        if not pro_ids:
+            return
+        # One indexed query confirms budget for all candidates at once
+        eligible = await db.pro_profiles.find(
+            {
+                "user_id": {"$in": pro_ids},
+                "budget_active": True,
+                "$expr": {"$lte": [{"$add": ["$weekly_spent", lead_fee]}, "$weekly_budget"]},
+            },
+            {"_id": 0, "user_id": 1}
+        ).to_list(len(pro_ids))
+        self.jobs_matched += 1
+        for row in eligible:
+            pubsub.publish(f"leads:{row['user_id']}", "lead", lead, lead.get("id"))
+            self.leads_sent += 1
+
+    def stats(self) -> Dict:
+        return {
+            "connected_pros": len(self.connected),
+            "jobs_matched": self.jobs_matched,
+            "leads_sent": self.leads_sent,
+        }
+
+
+lead_matcher = LeadMatcher()
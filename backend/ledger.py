@@ -0,0 +1,202 @@
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# A balance snapshot is written every this many ledger entries per pro, so
+# a balance read never replays more than this many entries
+LEDGER_SNAPSHOT_EVERY = int(os.environ.get("LEDGER_SNAPSHOT_EVERY", 50))
+
+BALANCE_FIELDS = ("weekly_budget", "weekly_spent")
+_BALANCE_PROJECTION = {"_id": 0, "ledger_seq": 1, "weekly_budget": 1, "weekly_spent": 1}
+
+
+async def ensure_ledger_indexes(db):
+    await db.credit_ledger.create_index([("pro_id", 1), ("seq", 1)], unique=True)
+    await db.ledger_snapshots.create_index([("pro_id", 1), ("seq", -1)], unique=True)
+
+
+async def open_ledgers(db):
+    """
+    Give profiles that predate the ledger an opening snapshot of their
+    current balance at seq 0. New profiles start at zero and need none.
+    """
+    async for profile in db.pro_profiles.find({"ledger_seq": {"$exists": False}}, {"_id": 0, "user_id": 1}):
+        opened = await db.pro_profiles.find_one_and_update(
+            {"user_id": profile["user_id"], "ledger_seq": {"$exists": False}},
+            {"$set": {"ledger_seq": 0}},
+            projection=_BALANCE_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if opened:
+            await db.ledger_snapshots.insert_one({
+                "pro_id": profile["user_id"],
+                "seq": 0,
+                "weekly_budget": opened.get("weekly_budget", 0.0),
+                "weekly_spent": opened.get("weekly_spent", 0.0),
+                "created_at": datetime.utcnow(),
+            })
+
+
+async def _record(db, pro_id: str, profile: Dict, budget_delta: float, spent_delta: float,
+                  kind: str, ref: Optional[str]) -> Dict:
+    entry = {
+        "id": str(uuid.uuid4()),
+        "pro_id": pro_id,
+        "seq": profile["ledger_seq"],
+        "kind": kind,
+        "ref": ref,
+        "budget_delta": budget_delta,
+        "spent_delta": spent_delta,
+        "weekly_budget": profile.get("weekly_budget", 0.0),
+        "weekly_spent": profile.get("weekly_spent", 0.0),
+        "created_at": datetime.utcnow(),
+    }
+    await db.credit_ledger.insert_one(entry)
+    entry.pop("_id")
+    if entry["seq"] % LEDGER_SNAPSHOT_EVERY == 0:
+        await write_snapshot(db, pro_id, entry["seq"])
+    return entry
+
+
+async def apply_credit(db, pro_id: str, kind: str, budget_delta: float = 0.0, spent_delta: float = 0.0,
+                       ref: Optional[str] = None, set_fields: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Move a pro's balance and append the movement to the ledger. The ledger
+    sequence number is taken in the same atomic update as the balance
+    change, so entries are ordered exactly as the updates were applied.
+    Returns the ledger entry, or None if the profile does not exist.
+    """
+    update = {"$inc": {"ledger_seq": 1}}
+    if budget_delta:
+        update["$inc"]["weekly_budget"] = budget_delta
+    if spent_delta:
+        update["$inc"]["weekly_spent"] = spent_delta
+    if set_fields:
+        update["$set"] = set_fields
+    profile = await db.pro_profiles.find_one_and_update(
+        {"user_id": pro_id}, update,
+        projection=_BALANCE_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if profile is None:
+        return None
+    return await _record(db, pro_id, profile, budget_delta, spent_delta, kind, ref)
+
+
+async def set_budget(db, pro_id: str, budget: float, kind: str = "budget_set") -> Optional[Dict]:
+    """Set weekly_budget outright, recording the difference as a movement"""
+    before = await db.pro_profiles.find_one_and_update(
+        {"user_id": pro_id},
+        {"$set": {"weekly_budget": budget}, "$inc": {"ledger_seq": 1}},
+        projection=_BALANCE_PROJECTION,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        return None
+    after = {**before, "weekly_budget": budget, "ledger_seq": before.get("ledger_seq", 0) + 1}
+    return await _record(db, pro_id, after, budget - before.get("weekly_budget", 0.0), 0.0, kind, None)
+
+
+async def _latest_snapshot(db, pro_id: str, max_seq: Optional[int] = None) -> Dict:
+    query = {"pro_id": pro_id}
+    if max_seq is not None:
+        query["seq"] = {"$lte": max_seq}
+    snapshot = await db.ledger_snapshots.find_one(query, {"_id": 0}, sort=[("seq", -1)])
+    return snapshot or {"pro_id": pro_id, "seq": 0, "weekly_budget": 0.0, "weekly_spent": 0.0}
+
+
+async def ledger_balance(db, pro_id: str, max_seq: Optional[int] = None) -> Dict:
+    """Balance from the latest snapshot plus the ledger entries after it"""
+    snapshot = await _latest_snapshot(db, pro_id, max_seq)
+    balance = {field: snapshot.get(field, 0.0) for field in BALANCE_FIELDS}
+    seq = snapshot["seq"]
+    replayed = 0
+    query = {"pro_id": pro_id, "seq": {"$gt": seq}}
+    if max_seq is not None:
+        query["seq"]["$lte"] = max_seq
+    async for entry in db.credit_ledger.find(
+        query, {"_id": 0, "seq": 1, "budget_delta": 1, "spent_delta": 1}
+    ).sort("seq", 1):
+        balance["weekly_budget"] += entry["budget_delta"]
+        balance["weekly_spent"] += entry["spent_delta"]
+        seq = entry["seq"]
+        replayed += 1
+    return {"pro_id": pro_id, "seq": seq, "complete": seq - snapshot["seq"] == replayed, **balance}
+
+
+async def write_snapshot(db, pro_id: str, seq: int):
+    balance = await ledger_balance(db, pro_id, max_seq=seq)
+    if not balance.pop("complete") or balance["seq"] != seq:
+        # An earlier entry is still being written; the next snapshot covers it
+        return
+    await db.ledger_snapshots.update_one(
+        {"pro_id": pro_id, "seq": balance["seq"]},
+        {"$setOnInsert": {
+            "weekly_budget": balance["weekly_budget"],
+            "weekly_spent": balance["weekly_spent"],
+            "created_at": datetime.utcnow(),
+        }},
+        upsert=True
+    )
+
+
+async def verify_ledgers(db, tolerance: float = 0.005, limit: int = 100) -> Dict:
+    """
+    Replay every ledger in bulk and compare with pro_profiles. Reports pros
+    whose replayed balance differs from their profile and pros with gaps in
+    their sequence (a balance update whose ledger write never landed).
+    """
+    openings = {}
+    async for snapshot in db.ledger_snapshots.find({"seq": 0}, {"_id": 0, "pro_id": 1, "weekly_budget": 1, "weekly_spent": 1}):
+        openings[snapshot["pro_id"]] = snapshot
+
+    totals = {}
+    async for row in db.credit_ledger.aggregate([
+        {"$group": {
+            "_id": "$pro_id",
+            "budget": {"$sum": "$budget_delta"},
+            "spent": {"$sum": "$spent_delta"},
+            "entries": {"$sum": 1},
+            "max_seq": {"$max": "$seq"},
+        }},
+    ], allowDiskUse=True):
+        totals[row["_id"]] = row
+
+    checked = 0
+    mismatches: List[Dict] = []
+    gaps: List[Dict] = []
+    async for profile in db.pro_profiles.find({}, {"_id": 0, "user_id": 1, **_BALANCE_PROJECTION}).batch_size(5000):
+        checked += 1
+        pro_id = profile["user_id"]
+        opening = openings.get(pro_id, {})
+        total = totals.get(pro_id, {})
+        expected_budget = opening.get("weekly_budget", 0.0) + total.get("budget", 0.0)
+        expected_spent = opening.get("weekly_spent", 0.0) + total.get("spent", 0.0)
+        if (abs(expected_budget - profile.get("weekly_budget", 0.0)) > tolerance
+                or abs(expected_spent - profile.get("weekly_spent", 0.0)) > tolerance):
+            mismatches.append({
+                "pro_id": pro_id,
+                "ledger": {"weekly_budget": expected_budget, "weekly_spent": expected_spent},
+                "profile": {"weekly_budget": profile.get("weekly_budget"), "weekly_spent": profile.get("weekly_spent")},
+            })
+        entries = total.get("entries", 0)
+        if entries != profile.get("ledger_seq", 0) or total.get("max_seq", 0) != profile.get("ledger_seq", 0):
+            gaps.append({"pro_id": pro_id, "ledger_seq": profile.get("ledger_seq", 0), "entries": entries})
+
+    if mismatches or gaps:
+        logger.warning("Ledger verification: %d mismatches, %d gaps over %d pros",
+                       len(mismatches), len(gaps), checked,
+                       extra={"mismatch_count": len(mismatches), "gap_count": len(gaps), "checked": checked})
+    return {
+        "checked": checked,
+        "mismatch_count": len(mismatches),
+        "gap_count": len(gaps),
+        "mismatches": mismatches[:limit],
+        "gaps": gaps[:limit],
+    }
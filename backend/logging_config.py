@@ -0,0 +1,168 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from responses import dumps
+from tracing import trace_ids
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "json" for production, "text" for reading logs in a terminal
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+# Records waiting for the writer thread before new ones are dropped
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+# Fraction of sub-WARNING records kept per logger, e.g. "access=0.1,server=0.5".
+# A logger inherits the rate of its nearest configured parent.
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "")
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        name, _, rate = part.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with extra= fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        try:
+            return dumps(entry).decode("utf-8")
+        except TypeError:
+            return dumps({k: v if isinstance(v, (str, int, float, bool)) else str(v) for k, v in entry.items()}).decode("utf-8")
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configured fraction of DEBUG/INFO records per logger; warnings always pass"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.cache: Dict[str, float] = {}
+
+    def rate(self, name: str) -> float:
+        rate = self.cache.get(name)
+        if rate is None:
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self.cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class TraceContextFilter(logging.Filter):
+    """Stamps records logged inside a traced request with its trace and span ids"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        ids = trace_ids()
+        if ids is not None:
+            record.trace_id, record.span_id = ids
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Enqueues records without formatting them. The stock QueueHandler merges
+    msg % args on the calling thread; here that happens on the listener
+    thread, so the event loop only pays for creating the record. Arguments
+    are formatted a moment later, so do not log objects that are about to
+    be mutated.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on logging; the backlog is lost instead
+            self.dropped += 1
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room so shutdown still flushes a full queue
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[LazyQueueHandler] = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def configure_logging():
+    """Route all logging through a queue drained by a background thread"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JSONFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    _handler = LazyQueueHandler(log_queue)
+    _handler.addFilter(SamplingFilter(parse_sample_rates(LOG_SAMPLE_RATES)))
+    _handler.addFilter(TraceContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+    # uvicorn installs its own stream handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = DrainingQueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records; called at shutdown"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,197 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# Upper bounds in seconds, Prometheus client defaults plus a 30s bucket for
+# exports and other long handlers
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, 30.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# One structured "access" record per request; sample it with LOG_SAMPLE_RATES
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "true").lower() == "true"
+access_logger = logging.getLogger("access")
+
+# ASGI scope of the request being handled. Motor copies the context onto its
+# executor threads, so command listeners can tell which route issued a query.
+request_scope: ContextVar[Optional[Dict]] = ContextVar("request_scope", default=None)
+
+
+def current_route() -> Optional[str]:
+    scope = request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else scope['path']}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a label tuple"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, labels: Tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, name: str, label_names: Tuple[str, ...]) -> Iterable[str]:
+        for labels, series in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f'{name}_bucket{{{base},le="{bound}"}} {cumulative}'
+            cumulative += series[len(self.buckets)]
+            yield f'{name}_bucket{{{base},le="+Inf"}} {cumulative}'
+            yield f"{name}_sum{{{base}}} {series[-1]}"
+            yield f"{name}_count{{{base}}} {cumulative}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+class HTTPMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.responses: Dict[Tuple, int] = defaultdict(int)
+        self.in_flight: Dict[str, int] = defaultdict(int)
+
+    def render(self) -> Iterable[str]:
+        yield "# HELP http_request_duration_seconds Handler latency by route"
+        yield "# TYPE http_request_duration_seconds histogram"
+        yield from self.latency.render("http_request_duration_seconds", ("method", "route"))
+        yield "# HELP http_responses_total Responses by route and status code"
+        yield "# TYPE http_responses_total counter"
+        for labels, count in sorted(self.responses.items()):
+            yield f'http_responses_total{{{_labels(("method", "route", "status"), labels)}}} {count}'
+        yield "# HELP http_requests_in_flight Requests currently being handled"
+        yield "# TYPE http_requests_in_flight gauge"
+        for method, count in sorted(self.in_flight.items()):
+            yield f'http_requests_in_flight{{method="{method}"}} {count}'
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Command latency by collection and operation. Motor runs pymongo on
+    executor threads, so the listener callbacks are serialised by a lock.
+    """
+
+    def __init__(self):
+        self.latency = Histogram(MONGO_BUCKETS)
+        self.failures: Dict[Tuple, int] = defaultdict(int)
+        self.pending: Dict[Tuple, Tuple[str, str]] = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = event.command.get("collection") if event.command_name == "getMore" else value
+        if not isinstance(collection, str):
+            collection = ""
+        with self.lock:
+            self.pending[(event.connection_id, event.request_id)] = (collection, event.command_name)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        with self.lock:
+            labels = self.pending.pop((event.connection_id, event.request_id), None)
+            if labels is None:
+                return
+            self.latency.observe(labels, event.duration_micros / 1e6)
+            if failed:
+                self.failures[labels] += 1
+
+    def render(self) -> Iterable[str]:
+        with self.lock:
+            latency = Histogram(MONGO_BUCKETS)
+            latency.series = {k: list(v) for k, v in self.latency.series.items()}
+            failures = dict(self.failures)
+        yield "# HELP mongodb_command_duration_seconds MongoDB command latency"
+        yield "# TYPE mongodb_command_duration_seconds histogram"
+        yield from latency.render("mongodb_command_duration_seconds", ("collection", "command"))
+        yield "# HELP mongodb_command_failures_total Failed MongoDB commands"
+        yield "# TYPE mongodb_command_failures_total counter"
+        for labels, count in sorted(failures.items()):
+            yield f'mongodb_command_failures_total{{{_labels(("collection", "command"), labels)}}} {count}'
+
+
+http_metrics = HTTPMetrics()
+mongo_metrics = MongoCommandMetrics()
+
+
+def render_metrics(gauges: Dict[str, float], counters: Dict[str, float]) -> str:
+    """Prometheus text exposition of all metrics plus ad-hoc gauges and counters"""
+    lines = list(http_metrics.render())
+    lines.extend(mongo_metrics.render())
+    for kind, values in (("gauge", gauges), ("counter", counters)):
+        for name, value in values.items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and counts responses by route template (not
+    raw path, so ids do not explode the label set) and status code. The
+    per-request cost is a dict lookup, a bisect and a few increments.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_metrics.in_flight[method] += 1
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_scope.reset(token)
+            http_metrics.in_flight[method] -= 1
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            elapsed = time.perf_counter() - start
+            http_metrics.latency.observe((method, route_path), elapsed)
+            http_metrics.responses[(method, route_path, status)] += 1
+            if ACCESS_LOG and access_logger.isEnabledFor(logging.INFO):
+                access_logger.info(
+                    "%s %s %d %.1fms", method, scope["path"], status, elapsed * 1000,
+                    extra={"method": method, "route": route_path, "status": status, "duration_ms": round(elapsed * 1000, 2)}
+                )
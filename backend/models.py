@@ -62,6 +62,7 @@ class ProProfile(BaseModel):
     weekly_budget: float = 0.0
     weekly_spent: float = 0.0
     budget_active: bool = True
+    time_zone: Optional[str] = None  # IANA name; weekly spend resets Monday 00:00 local
     rating: float = 0.0
     total_jobs: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -89,6 +90,7 @@ class Job(BaseModel):
     location: str
     zipcode: str
     images: List[str] = []
+    thumbnail: Optional[str] = None
     budget_min: Optional[float] = None
     budget_max: Optional[float] = None
     timeline: str
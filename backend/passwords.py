@@ -0,0 +1,65 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from fastapi import HTTPException
+
+from tracing import span
+
+# bcrypt work factor for new hashes. Existing hashes keep the cost they were
+# created with, so this can be raised without invalidating passwords.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+# Threads dedicated to bcrypt. bcrypt releases the GIL, so this bounds how
+# many cores login/registration traffic can occupy at once.
+BCRYPT_WORKERS = int(os.environ.get("BCRYPT_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Hashing jobs allowed to wait for a thread before new ones are rejected
+BCRYPT_QUEUE_LIMIT = int(os.environ.get("BCRYPT_QUEUE_LIMIT", 64))
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+def _hash_sync(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def _verify_sync(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+async def _run(func, *args):
+    global _pending
+    if _pending >= BCRYPT_WORKERS + BCRYPT_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please retry",
+            headers={"Retry-After": "1"}
+        )
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the bcrypt executor without blocking the event loop"""
+    with span("bcrypt.hash", rounds=BCRYPT_ROUNDS):
+        return await _run(_hash_sync, password)
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Check a password on the bcrypt executor without blocking the event loop"""
+    with span("bcrypt.verify"):
+        return await _run(_verify_sync, password, hashed)
+
+
+def pending_jobs() -> int:
+    """Number of hashing jobs running or waiting for a thread"""
+    return _pending
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,229 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import List, Optional
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+
+from auth import verify_access_token
+
+# Longest whole-process profile an admin can ask for
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", 60))
+# Time between samples; 10ms (100Hz) costs well under 1% of a core
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 10))
+# Tagged-request profiles kept for download, oldest dropped first
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 20))
+# Requests carrying this header and an admin token are profiled
+PROFILE_HEADER = "x-profile"
+
+# Leaf functions of threads that are parked rather than using CPU
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+}
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_LEAVES
+
+
+def _thread_stack(leaf, root=None) -> Optional[List]:
+    """Frames from root (or the thread's entry point) down to leaf; None if root is not on the stack"""
+    frames = []
+    frame = leaf
+    while frame is not None:
+        frames.append(frame)
+        if frame is root:
+            break
+        frame = frame.f_back
+    if root is not None and frame is not root:
+        return None
+    frames.reverse()
+    return frames
+
+
+def _awaiting_stack(coro, root) -> List[str]:
+    """Where a suspended task is parked: the await chain below root"""
+    names, seen_root = [], False
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            # A future or other non-coroutine awaitable: I/O, a timer, a thread
+            names.append("[waiting]")
+            break
+        seen_root = seen_root or frame is root
+        if seen_root:
+            names.append(_frame_name(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return names
+
+
+def collapse(counts: Counter) -> str:
+    """Brendan Gregg's collapsed-stack format, readable by flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def sample_process(seconds: float, interval: float, include_idle: bool = False) -> Counter:
+    """Sample every other thread's stack until seconds have passed"""
+    me = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, leaf in sys._current_frames().items():
+            if ident == me or (not include_idle and _is_idle(leaf)):
+                continue
+            stack = [names.get(ident, str(ident))] + [_frame_name(f) for f in _thread_stack(leaf)]
+            counts[";".join(stack)] += 1
+        time.sleep(interval)
+    return counts
+
+
+class Profiler:
+    """
+    Statistical sampler for the live process. Only one whole-process
+    profile and one tagged request run at a time, so admins cannot stack
+    samplers on a worker that is already hot.
+    """
+
+    def __init__(self):
+        self.busy = threading.Lock()
+        self.request_busy = threading.Lock()
+        self.request_profiles: "OrderedDict[str, str]" = OrderedDict()
+
+    async def profile(self, seconds: float, interval_ms: Optional[float] = None,
+                      include_idle: bool = False) -> str:
+        if not 0 < seconds <= PROFILE_MAX_SECONDS:
+            raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}")
+        interval = max(interval_ms or PROFILE_INTERVAL_MS, 1) / 1000
+        if not self.busy.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="A profile is already running")
+        try:
+            counts = await asyncio.to_thread(sample_process, seconds, interval, include_idle)
+        finally:
+            self.busy.release()
+        return collapse(counts)
+
+    def start_request(self, root) -> Optional["RequestSampler"]:
+        if not self.request_busy.acquire(blocking=False):
+            return None
+        sampler = RequestSampler(threading.get_ident(), asyncio.current_task(), root)
+        sampler.start()
+        return sampler
+
+    def finish_request(self, sampler: "RequestSampler", profile_id: str, label: str):
+        counts = sampler.stop()
+        self.request_busy.release()
+        self.request_profiles[profile_id] = collapse(Counter({
+            f"{label};{stack}": count for stack, count in counts.items()
+        }))
+        while len(self.request_profiles) > PROFILE_KEEP:
+            self.request_profiles.popitem(last=False)
+
+    def request_profile(self, profile_id: str) -> str:
+        profile = self.request_profiles.get(profile_id)
+        if profile is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return profile
+
+
+class RequestSampler:
+    """
+    Samples one request's task on the event loop thread. A sample where
+    the task is on the stack records what it is running; otherwise the
+    request is waiting, and the sample records the await it is parked on,
+    so the profile covers wall-clock time end to end.
+    """
+
+    def __init__(self, thread_id: int, task: asyncio.Task, root):
+        self.thread_id = thread_id
+        self.task = task
+        self.root = root
+        self.counts: Counter = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self) -> Counter:
+        self.stopped.set()
+        self.thread.join()
+        return self.counts
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while not self.stopped.wait(interval):
+            leaf = sys._current_frames().get(self.thread_id)
+            frames = _thread_stack(leaf, self.root) if leaf is not None else None
+            if frames is not None:
+                self.counts[";".join(_frame_name(f) for f in frames)] += 1
+                continue
+            try:
+                names = _awaiting_stack(self.task.get_coro(), self.root)
+            except Exception:
+                # The loop moved the task on while we walked it
+                continue
+            if names:
+                self.counts[";".join(names)] += 1
+
+
+profiler = Profiler()
+
+
+def _is_admin(headers: Headers) -> bool:
+    header = headers.get("authorization", "")
+    if not header.startswith("Bearer "):
+        return False
+    claims = verify_access_token(header[len("Bearer "):])
+    return claims is not None and claims.get("role") == "admin"
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests an admin tags with an X-Profile header. The response
+    carries X-Profile-Id, and the collapsed stacks are fetched from
+    /api/admin/profile/requests/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if PROFILE_HEADER not in headers or not _is_admin(headers):
+            await self.app(scope, receive, send)
+            return
+        sampler = profiler.start_request(sys._getframe())
+        if sampler is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = str(uuid.uuid4())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            label = f"{scope['method']} {route.path if route is not None else scope['path']}"
+            profiler.finish_request(sampler, profile_id, label)
@@ -0,0 +1,96 @@
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+# Length of the description excerpt returned in summary views
+DESCRIPTION_EXCERPT_LENGTH = 200
+
+# Compact job card used by the job feeds (customer dashboard, pro lead feed).
+# The description is cut down inside Mongo and the full-size images are
+# replaced by a small stored thumbnail (see thumbnails.py) and a count, so
+# large bodies and base64 images never leave the database.
+JOB_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "customer_id": 1,
+    "customer_name": 1,
+    "title": 1,
+    "description": {"$substrCP": ["$description", 0, DESCRIPTION_EXCERPT_LENGTH]},
+    "category": 1,
+    "location": 1,
+    "zipcode": 1,
+    "thumbnail": 1,
+    "image_count": {"$size": {"$ifNull": ["$images", []]}},
+    "budget_min": 1,
+    "budget_max": 1,
+    "timeline": 1,
+    "status": 1,
+    "created_at": 1,
+    "quotes_count": 1,
+}
+
+JOB_FIELDS = {
+    "id", "customer_id", "customer_name", "customer_phone", "title", "description",
+    "category", "location", "zipcode", "images", "thumbnail", "budget_min", "budget_max",
+    "timeline", "status", "created_at", "quotes_count",
+}
+
+# Compact pro card used by pro search results
+PRO_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "user_id": 1,
+    "bio": {"$substrCP": [{"$ifNull": ["$bio", ""]}, 0, DESCRIPTION_EXCERPT_LENGTH]},
+    "services": 1,
+    "service_areas": 1,
+    "hourly_rate": 1,
+    "years_experience": 1,
+    "background_check_verified": 1,
+    "rating": 1,
+    "total_jobs": 1,
+    "portfolio_count": {"$size": {"$ifNull": ["$portfolio_images", []]}},
+}
+
+PRO_PROFILE_FIELDS = {
+    "user_id", "bio", "services", "service_areas", "hourly_rate", "years_experience",
+    "profile_image", "logo_image", "portfolio_images", "certifications",
+    "background_check_verified", "background_check_status", "weekly_budget",
+    "weekly_spent", "budget_active", "rating", "total_jobs", "cashapp_handle",
+    "business_name", "created_at", "google_connected", "google_business_info",
+}
+
+
+def build_projection(
+    view: Optional[str],
+    fields: Optional[str],
+    summary: Dict,
+    allowed: set,
+    default_view: str = "summary",
+) -> Optional[Dict]:
+    """
+    Turn the ?view= and ?fields= query parameters into a Mongo projection.
+    fields= takes precedence over view=. Returns None for the detail view,
+    meaning the full document is fetched.
+    """
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in allowed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        projection = {"_id": 0}
+        projection.update({f: 1 for f in requested})
+        return projection
+
+    view = view or default_view
+    if view == "summary":
+        return summary
+    if view == "detail":
+        return None
+    raise HTTPException(status_code=400, detail="Invalid view, expected 'summary' or 'detail'")
+
+
+def job_summary(job: Dict) -> Dict:
+    """The JOB_SUMMARY_PROJECTION card built from an in-memory job document"""
+    summary = {k: job.get(k) for k, v in JOB_SUMMARY_PROJECTION.items() if v == 1}
+    summary["description"] = (job.get("description") or "")[:DESCRIPTION_EXCERPT_LENGTH]
+    summary["image_count"] = len(job.get("images") or [])
+    return summary
@@ -0,0 +1,93 @@
+import re
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+# Weights of the "best" score; each component is normalised to 0..1
+PRICE_WEIGHT = 0.5
+RATING_WEIGHT = 0.35
+SPEED_WEIGHT = 0.15
+
+# Sort value for durations that could not be parsed, so they rank last
+# under sort=fastest
+UNKNOWN_DURATION_HOURS = 1_000_000.0
+
+HOURS_PER_UNIT = {
+    "min": 1 / 60, "minute": 1 / 60,
+    "h": 1, "hr": 1, "hour": 1,
+    "day": 24, "week": 24 * 7, "month": 24 * 30,
+}
+DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(?:\s*(?:-|to)\s*(\d+(?:\.\d+)?))?\s*(min(?:ute)?|hr|hour|h|day|week|month)s?\b")
+
+# sort option -> Mongo sort; each has a matching (job_id, ...) index
+QUOTE_SORTS = {
+    "newest": [("created_at", -1)],
+    "best": [("rank.score", -1), ("created_at", -1)],
+    "price": [("price", 1), ("created_at", -1)],
+    "rating": [("pro_rating", -1), ("created_at", -1)],
+    "fastest": [("rank.hours", 1), ("created_at", -1)],
+}
+
+
+def parse_duration_hours(text: str) -> Optional[float]:
+    """
+    Hours for free-text durations like "2 hours", "1 day" or "2-3 days".
+    Ranges use their upper bound. Returns None when nothing is recognised.
+    """
+    match = DURATION_RE.search((text or "").lower())
+    if not match:
+        return None
+    low, high, unit = match.groups()
+    return float(high or low) * HOURS_PER_UNIT[unit]
+
+
+def price_score(price: float, budget_min: Optional[float], budget_max: Optional[float]) -> float:
+    """1.0 at or below the bottom of the job's budget, 0.5 at the top, decaying above it"""
+    low = budget_min or 0.0
+    high = budget_max or budget_min
+    if not high or price <= 0:
+        return 0.5
+    if price <= low:
+        return 1.0
+    if price <= high:
+        return 1.0 - 0.5 * (price - low) / max(high - low, 1e-9)
+    return 0.5 * high / price
+
+
+def quote_rank(quote: Dict, job: Optional[Dict]) -> Dict:
+    """Ranking fields stored on a quote when it is created"""
+    job = job or {}
+    hours = parse_duration_hours(quote.get("estimated_duration", ""))
+    speed = 0.0 if hours is None else 1.0 / (1.0 + hours / 24)
+    score = (
+        PRICE_WEIGHT * price_score(quote["price"], job.get("budget_min"), job.get("budget_max"))
+        + RATING_WEIGHT * min((quote.get("pro_rating") or 0.0) / 5.0, 1.0)
+        + SPEED_WEIGHT * speed
+    )
+    return {"score": round(score, 4), "hours": UNKNOWN_DURATION_HOURS if hours is None else hours}
+
+
+def quote_sort(sort: str):
+    if sort not in QUOTE_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort '{sort}'")
+    return QUOTE_SORTS[sort]
+
+
+async def ensure_quote_indexes(db):
+    for spec in QUOTE_SORTS.values():
+        await db.quotes.create_index([("job_id", 1)] + spec)
+
+
+async def backfill_quote_ranks(db):
+    """Compute ranking fields for quotes created before they were stored"""
+    budgets = {}
+    async for quote in db.quotes.find(
+        {"rank": {"$exists": False}},
+        {"_id": 0, "id": 1, "job_id": 1, "price": 1, "pro_rating": 1, "estimated_duration": 1}
+    ):
+        job_id = quote.get("job_id")
+        if job_id not in budgets:
+            budgets[job_id] = await db.jobs.find_one(
+                {"id": job_id}, {"_id": 0, "budget_min": 1, "budget_max": 1}
+            )
+        await db.quotes.update_one({"id": quote["id"]}, {"$set": {"rank": quote_rank(quote, budgets[job_id])}})
@@ -0,0 +1,144 @@
+import asyncio
+import inspect
+import logging
+import os
+from collections import defaultdict
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before it is treated as a slow consumer
+SUBSCRIBER_QUEUE_SIZE = int(os.environ.get("SUBSCRIBER_QUEUE_SIZE", 100))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+
+
+class Subscriber:
+    def __init__(self, topic: str, kind: str):
+        self.topic = topic
+        self.kind = kind
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class PubSub:
+    """
+    In-process fan-out from publishers (handlers, change-stream bridges) to
+    connected clients. Each subscriber gets a bounded queue; a client that
+    falls SUBSCRIBER_QUEUE_SIZE events behind is cut off and told to resync
+    instead of letting its backlog grow without limit.
+    """
+
+    def __init__(self):
+        self.topics: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+        self.peak_queue_depth = 0
+
+    def subscribe(self, topic: str, kind: str) -> Subscriber:
+        subscriber = Subscriber(topic, kind)
+        self.topics[topic].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.topics.get(subscriber.topic)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.topics[subscriber.topic]
+
+    def publish(self, topic: str, event: str, data: Dict, event_id: Optional[str] = None):
+        self.published += 1
+        for subscriber in list(self.topics.get(topic, ())):
+            if subscriber.overflowed:
+                continue
+            try:
+                subscriber.queue.put_nowait((event, data, event_id))
+                self.delivered += 1
+                self.peak_queue_depth = max(self.peak_queue_depth, subscriber.queue.qsize())
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.overflows += 1
+
+    def stats(self) -> Dict:
+        connections = defaultdict(int)
+        queued = 0
+        for subscribers in self.topics.values():
+            for subscriber in subscribers:
+                connections[subscriber.kind] += 1
+                queued += subscriber.queue.qsize()
+        return {
+            "connections": dict(connections),
+            "topics": len(self.topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "queued": queued,
+            "peak_queue_depth": self.peak_queue_depth,
+            "slow_consumer_disconnects": self.overflows,
+        }
+
+
+pubsub = PubSub()
+
+
+def format_sse(event: str, data: Dict, event_id: Optional[str] = None) -> bytes:
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    return ("\n".join(lines) + "\n").encode("utf-8") + b"data: " + dumps(data) + b"\n\n"
+
+
+async def sse_stream(subscriber: Subscriber, on_close: Optional[Callable] = None) -> AsyncIterator[bytes]:
+    """Drain a subscriber's queue as Server-Sent Events until it disconnects"""
+    try:
+        yield b": connected\n\n"
+        while True:
+            if subscriber.overflowed and subscriber.queue.empty():
+                # The client missed events; it should refetch and reconnect
+                yield format_sse("resync", {"reason": "slow_consumer"})
+                return
+            try:
+                event, data, event_id = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            yield format_sse(event, data, event_id)
+    finally:
+        pubsub.unsubscribe(subscriber)
+        if on_close is not None:
+            on_close(subscriber)
+
+
+async def bridge_collection(collection, on_change: Callable, operations=("insert",)):
+    """
+    Feed documents written to a collection, by any worker, to on_change
+    through a change stream. Updates deliver the full post-update document.
+    Resumes from the last seen token after errors.
+    """
+    resume_token = None
+    while True:
+        try:
+            async with collection.watch(
+                [{"$match": {"operationType": {"$in": list(operations)}}}],
+                full_document="updateLookup",
+                resume_after=resume_token
+            ) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    doc = change.get("fullDocument")
+                    if doc is None:
+                        # Deleted again before the lookup ran
+                        continue
+                    doc.pop("_id", None)
+                    result = on_change(doc)
+                    if inspect.isawaitable(result):
+                        await result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Change stream on %s failed: %s", collection.name, e,
+                         extra={"collection": collection.name, "error": str(e)})
+            await asyncio.sleep(1)
@@ -0,0 +1,57 @@
+import functools
+import inspect
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import Response
+
+
+def _default(obj: Any):
+    # orjson handles str/int/float/dict/list, datetimes and str Enums natively;
+    # this only sees the rare types it does not know
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered straight to bytes with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class FastJSONRoute(APIRoute):
+    """
+    Route whose endpoint results are encoded with orjson directly, skipping
+    FastAPI's jsonable_encoder pass over every document. Endpoints that
+    return a Response themselves are left alone.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _encode_result(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _encode_result(endpoint):
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        if isinstance(result, Response):
+            return result
+        return FastJSONResponse(result)
+
+    return wrapper
@@ -1,14 +1,15 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import List, Optional, Dict
 import os
+import asyncio
 import logging
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
-import bcrypt
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 
 from models import (
@@ -21,70 +22,139 @@ from models import (
     ServiceCategory, PlatformSettings, AdminAnalytics,
     ServiceCategoryCreate, ServiceCategoryUpdate
 )
+from projections import (
+    build_projection,
+    JOB_SUMMARY_PROJECTION, JOB_FIELDS,
+    PRO_SUMMARY_PROJECTION, PRO_PROFILE_FIELDS, job_summary
+)
+from pymongo.errors import DuplicateKeyError
+import passwords
+from passwords import hash_password, verify_password
+from auth import (
+    create_access_token, verify_access_token, get_current_user, check_caller, require_admin,
+    revoke_user_sessions, ensure_revocation_index, poll_revocations
+)
+from throttle import login_throttle, ensure_login_bucket_index, shared_occupancy, LOGIN_THROTTLE_SHARED
+from responses import FastJSONResponse, FastJSONRoute
+from compression import CompressionMiddleware, compression_stats
+from exports import EXPORTS, MEDIA_TYPES, build_export_query, stream_export
+from realtime import pubsub, sse_stream, bridge_collection
+from leads import lead_matcher
+from lead_index import lead_index, load_index, refresh_pro
+from ledger import apply_credit, set_budget, ledger_balance, verify_ledgers, ensure_ledger_indexes, open_ledgers
+from budget_reset import run_budget_resets, ensure_budget_reset_indexes
+from metrics import MetricsMiddleware, mongo_metrics, render_metrics, CONTENT_TYPE
+from slow_queries import slow_query_log, ensure_slow_query_collection, slow_query_report
+from db_calls import DBCallMiddleware, db_call_counter
+from logging_config import configure_logging, stop_logging, dropped_records
+from tracing import TracingMiddleware, mongo_tracer, exporter as span_exporter, span, KIND_CLIENT
+from profiler import ProfilingMiddleware, profiler
+from allocations import memory_snapshots
+from quote_ranking import quote_rank, quote_sort, ensure_quote_indexes, backfill_quote_ranks
+from thumbnails import job_thumbnail, backfill_thumbnails
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_metrics, slow_query_log, db_call_counter, mongo_tracer])
 db = client[os.environ['DB_NAME']]
 
 # Stripe configuration
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
 
-app = FastAPI(title="Qozii API")
-api_router = APIRouter(prefix="/api")
+# Charged against a pro's weekly budget for each quote submitted
+LEAD_FEE = 10.0
 
-logging.basicConfig(level=logging.INFO)
+app = FastAPI(title="Qozii API", default_response_class=FastJSONResponse)
+# Handlers return plain dicts/lists; FastJSONRoute encodes them with orjson
+api_router = APIRouter(prefix="/api", route_class=FastJSONRoute)
+
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Helper function to hash passwords
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# Set at startup; multi-document transactions and change streams need a
+# replica set or mongos
+transactions_supported = False
+
+def new_pro_profile(user_id: str) -> dict:
+    return {
+        "user_id": user_id,
+        "bio": None,
+        "services": [],
+        "service_areas": [],
+        "hourly_rate": None,
+        "years_experience": None,
+        "profile_image": None,  # Personal photo
+        "logo_image": None,  # Business logo
+        "portfolio_images": [],  # Work samples
+        "certifications": [],
+        "background_check_verified": False,
+        "weekly_budget": 0.0,
+        "weekly_spent": 0.0,
+        "ledger_seq": 0,
+        "budget_active": True,
+        "rating": 0.0,
+        "total_jobs": 0,
+        "cashapp_handle": None,  # For CashApp payments
+        "created_at": datetime.utcnow()
+    }
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def insert_pro_account(user_dict: dict, password_hash: asyncio.Future):
+    pro_profile = new_pro_profile(user_dict["id"])
+    # Hash before any transaction opens, so bcrypt never holds one open
+    user_dict["password"] = await password_hash
+    if not transactions_supported:
+        await db.users.insert_one(user_dict)
+        try:
+            await db.pro_profiles.insert_one(pro_profile)
+        except Exception:
+            await db.users.delete_one({"id": user_dict["id"]})
+            raise
+        return
+
+    async def insert_both(session):
+        # The user goes first so a duplicate email fails before the profile
+        await db.users.insert_one(user_dict, session=session)
+        await db.pro_profiles.insert_one(pro_profile, session=session)
+
+    async with await client.start_session() as session:
+        # Two signups racing for one email conflict as a transient write
+        # conflict; with_transaction retries the loser, which then sees the
+        # winner's committed user and fails with DuplicateKeyError
+        await session.with_transaction(insert_both)
+
+async def pro_profile_changed(pro_id: str):
+    # With a replica set the pro_profiles change stream keeps every worker's
+    # lead index current; otherwise refresh this worker's copy directly
+    if not transactions_supported:
+        await refresh_pro(db, lead_index, pro_id)
 
 # ============ USER ROUTES ============
 @api_router.post("/users/register")
 async def register_user(user_data: UserCreate):
-    # Check if user exists
-    existing = await db.users.find_one({"email": user_data.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
+    # Admin accounts are provisioned directly in the database, never self-registered
+    if user_data.role == UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Admin accounts cannot be registered")
     user_dict = user_data.dict()
-    user_dict["password"] = hash_password(user_dict["password"])
     user_dict["id"] = str(uuid.uuid4())
     user_dict["created_at"] = datetime.utcnow()
     user_dict["is_active"] = True
+    password_hash = asyncio.ensure_future(hash_password(user_dict["password"]))
     
-    result = await db.users.insert_one(user_dict)
-    
-    # If pro, create pro profile
-    if user_data.role == UserRole.PRO:
-        pro_profile = {
-            "user_id": user_dict["id"],
-            "bio": None,
-            "services": [],
-            "service_areas": [],
-            "hourly_rate": None,
-            "years_experience": None,
-            "profile_image": None,  # Personal photo
-            "logo_image": None,  # Business logo
-            "portfolio_images": [],  # Work samples
-            "certifications": [],
-            "background_check_verified": False,
-            "weekly_budget": 0.0,
-            "weekly_spent": 0.0,
-            "budget_active": True,
-            "rating": 0.0,
-            "total_jobs": 0,
-            "cashapp_handle": None,  # For CashApp payments
-            "created_at": datetime.utcnow()
-        }
-        await db.pro_profiles.insert_one(pro_profile)
+    # Duplicate emails are rejected by the unique index on users.email
+    try:
+        if user_data.role == UserRole.PRO:
+            await insert_pro_account(user_dict, password_hash)
+            await pro_profile_changed(user_dict["id"])
+        else:
+            user_dict["password"] = await password_hash
+            await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    finally:
+        password_hash.cancel()
     
     # Return clean user data
     return_user = {
@@ -96,33 +166,33 @@ async def register_user(user_data: UserCreate):
         "created_at": user_dict["created_at"],
         "is_active": user_dict["is_active"]
     }
-    return {"success": True, "user": return_user}
+    return {"success": True, "user": return_user, "access_token": create_access_token(return_user)}
 
 @api_router.post("/users/login")
-async def login_user(email: str, password: str):
-    user = await db.users.find_one({"email": email})
-    if not user or not verify_password(password, user["password"]):
+async def login_user(request: Request, email: str, password: str):
+    # Throttle before touching bcrypt so floods cannot exhaust the hashing pool
+    await login_throttle.check(db, request, email)
+    user = await db.users.find_one({"email": email}, {"_id": 0})
+    if not user or not await verify_password(password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if not user.get("is_active", True):
+        raise HTTPException(status_code=403, detail="Account deactivated")
     
     user.pop("password")
-    user["_id"] = str(user["_id"])
-    return {"success": True, "user": user}
+    return {"success": True, "user": user, "access_token": create_access_token(user)}
 
 @api_router.get("/users/{user_id}")
 async def get_user(user_id: str):
-    user = await db.users.find_one({"id": user_id})
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    user.pop("password", None)
-    user["_id"] = str(user["_id"])
     return user
 
 # ============ PRO PROFILE ROUTES ============
 @api_router.get("/pros/{user_id}/profile")
-async def get_pro_profile(user_id: str):
-    logger.info(f"Fetching pro profile for user_id: {user_id}")
-    profile = await db.pro_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    logger.info(f"Profile found: {profile is not None}")
+async def get_pro_profile(user_id: str, fields: Optional[str] = None):
+    projection = build_projection("detail", fields, PRO_SUMMARY_PROJECTION, PRO_PROFILE_FIELDS) or {"_id": 0}
+    profile = await db.pro_profiles.find_one({"user_id": user_id}, projection)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
@@ -135,8 +205,36 @@ async def update_pro_profile(user_id: str, profile_data: dict):
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Profile not found")
+    await pro_profile_changed(user_id)
     return {"success": True}
 
+@api_router.get("/pros/{user_id}/leads/stream")
+async def stream_leads(
+    user_id: str,
+    token: Optional[str] = None,
+    caller: Optional[Dict] = Depends(get_current_user)
+):
+    """
+    Server-Sent Events feed of newly posted jobs matching the pro's services
+    and service areas, sent only while the pro's budget can cover a lead.
+    """
+    if caller is None and token:
+        caller = verify_access_token(token)
+        if caller is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+    check_caller(caller, user_id)
+    
+    profile = await db.pro_profiles.find_one({"user_id": user_id}, {"_id": 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    subscriber = lead_matcher.connect(user_id)
+    return StreamingResponse(
+        sse_stream(subscriber, on_close=lead_matcher.disconnect),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.post("/pros/{user_id}/upload-image")
 async def upload_pro_image(user_id: str, image_data: dict):
     """
@@ -192,18 +290,31 @@ async def delete_portfolio_image(user_id: str, image_index: int):
     return {"success": True, "message": "Image deleted successfully"}
 
 @api_router.get("/pros/search")
-async def search_pros(category: Optional[str] = None, location: Optional[str] = None):
+async def search_pros(
+    category: Optional[str] = None,
+    location: Optional[str] = None,
+    view: Optional[str] = None,
+    fields: Optional[str] = None
+):
     query = {}
     if category:
         query["services"] = category
     if location:
         query["service_areas"] = {"$regex": location, "$options": "i"}
     
-    profiles = await db.pro_profiles.find(query).to_list(100)
+    projection = build_projection(view, fields, PRO_SUMMARY_PROJECTION, PRO_PROFILE_FIELDS)
+    if projection is not None and "user_id" not in projection:
+        # user_id is needed to join the user's name and phone
+        projection = {**projection, "user_id": 1}
+    profiles = await db.pro_profiles.find(query, projection or {"_id": 0}).to_list(100)
+    # One lookup for every pro's name and phone
+    users = await db.users.find(
+        {"id": {"$in": [p["user_id"] for p in profiles]}},
+        {"_id": 0, "id": 1, "name": 1, "phone": 1}
+    ).to_list(len(profiles))
+    users_by_id = {u["id"]: u for u in users}
     for profile in profiles:
-        profile["_id"] = str(profile["_id"])
-        # Get user info
-        user = await db.users.find_one({"id": profile["user_id"]})
+        user = users_by_id.get(profile["user_id"])
         if user:
             profile["name"] = user["name"]
             profile["phone"] = user["phone"]
@@ -211,7 +322,8 @@ async def search_pros(category: Optional[str] = None, location: Optional[str] =
 
 # ============ JOB ROUTES ============
 @api_router.post("/jobs")
-async def create_job(job_data: JobCreate, customer_id: str):
+async def create_job(job_data: JobCreate, customer_id: str, caller: Optional[Dict] = Depends(get_current_user)):
+    check_caller(caller, customer_id)
     # Get customer info
     customer = await db.users.find_one({"id": customer_id})
     if not customer:
@@ -225,11 +337,16 @@ async def create_job(job_data: JobCreate, customer_id: str):
     job_dict["status"] = JobStatus.OPEN
     job_dict["created_at"] = datetime.utcnow()
     job_dict["quotes_count"] = 0
+    job_dict["thumbnail"] = await job_thumbnail(job_dict["images"])
     
     await db.jobs.insert_one(job_dict)
-    job_dict["_id"] = str(job_dict["_id"])
+    job_dict.pop("_id")
+    if not transactions_supported:
+        # Without a replica set there is no change stream to pick this up
+        await lead_matcher.dispatch(db, job_dict, job_summary(job_dict), LEAD_FEE)
     
-    logger.info(f"Job created: {job_dict['id']} by customer {customer_id}")
+    logger.info("Job created: %s by customer %s", job_dict["id"], customer_id,
+                extra={"job_id": job_dict["id"], "customer_id": customer_id})
     return {"success": True, "job": job_dict}
 
 @api_router.get("/jobs")
@@ -237,7 +354,9 @@ async def get_jobs(
     status: Optional[str] = None,
     category: Optional[str] = None,
     location: Optional[str] = None,
-    customer_id: Optional[str] = None
+    customer_id: Optional[str] = None,
+    view: Optional[str] = None,
+    fields: Optional[str] = None
 ):
     query = {}
     if status:
@@ -249,19 +368,29 @@ async def get_jobs(
     if customer_id:
         query["customer_id"] = customer_id
     
-    jobs = await db.jobs.find(query).sort("created_at", -1).to_list(100)
-    for job in jobs:
-        job["_id"] = str(job["_id"])
+    # Summary cards by default; ?view=detail returns full documents
+    projection = build_projection(view, fields, JOB_SUMMARY_PROJECTION, JOB_FIELDS)
+    jobs = await db.jobs.find(query, projection or {"_id": 0}).sort("created_at", -1).to_list(100)
     return jobs
 
 @api_router.get("/jobs/{job_id}")
 async def get_job(job_id: str):
-    job = await db.jobs.find_one({"id": job_id})
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    job["_id"] = str(job["_id"])
     return job
 
+@api_router.get("/jobs/{job_id}/matching-pros")
+async def get_matching_pros(job_id: str, limit: int = 20):
+    """Pros who should see this job, ranked by rating, remaining budget and recency"""
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "category": 1, "location": 1, "zipcode": 1})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return [
+        {"pro_id": pro_id, "score": score}
+        for pro_id, score in lead_index.match(job, LEAD_FEE, limit=max(1, min(limit, 100)))
+    ]
+
 @api_router.put("/jobs/{job_id}/status")
 async def update_job_status(job_id: str, status: JobStatus):
     result = await db.jobs.update_one(
@@ -274,7 +403,8 @@ async def update_job_status(job_id: str, status: JobStatus):
 
 # ============ QUOTE ROUTES ============
 @api_router.post("/quotes")
-async def create_quote(quote_data: QuoteCreate, pro_id: str):
+async def create_quote(quote_data: QuoteCreate, pro_id: str, caller: Optional[Dict] = Depends(get_current_user)):
+    check_caller(caller, pro_id)
     # Get pro info
     pro_user = await db.users.find_one({"id": pro_id})
     pro_profile = await db.pro_profiles.find_one({"user_id": pro_id})
@@ -283,7 +413,7 @@ async def create_quote(quote_data: QuoteCreate, pro_id: str):
         raise HTTPException(status_code=404, detail="Pro not found")
     
     # Check budget
-    lead_fee = 10.0  # $10 per lead
+    lead_fee = LEAD_FEE
     if pro_profile["weekly_spent"] + lead_fee > pro_profile["weekly_budget"]:
         raise HTTPException(status_code=400, detail="Weekly budget exceeded")
     
@@ -295,14 +425,17 @@ async def create_quote(quote_data: QuoteCreate, pro_id: str):
     quote_dict["pro_rating"] = pro_profile["rating"]
     quote_dict["status"] = QuoteStatus.PENDING
     quote_dict["created_at"] = datetime.utcnow()
+    job = await db.jobs.find_one({"id": quote_data.job_id}, {"_id": 0, "budget_min": 1, "budget_max": 1})
+    quote_dict["rank"] = quote_rank(quote_dict, job)
     
     await db.quotes.insert_one(quote_dict)
     
     # Charge lead fee
-    await db.pro_profiles.update_one(
-        {"user_id": pro_id},
-        {"$inc": {"weekly_spent": lead_fee}}
+    await apply_credit(
+        db, pro_id, "lead_fee", spent_delta=lead_fee, ref=quote_dict["id"],
+        set_fields={"last_active_at": datetime.utcnow()}
     )
+    await pro_profile_changed(pro_id)
     
     # Update job quotes count
     await db.jobs.update_one(
@@ -322,21 +455,21 @@ async def create_quote(quote_data: QuoteCreate, pro_id: str):
     }
     await db.payments.insert_one(payment)
     
-    quote_dict["_id"] = str(quote_dict["_id"])
-    logger.info(f"Quote created: {quote_dict['id']} by pro {pro_id}, charged ${lead_fee}")
+    quote_dict.pop("_id")
+    logger.info("Quote created: %s by pro %s, charged $%s", quote_dict["id"], pro_id, lead_fee,
+                extra={"quote_id": quote_dict["id"], "pro_id": pro_id, "lead_fee": lead_fee})
     return {"success": True, "quote": quote_dict}
 
 @api_router.get("/quotes")
-async def get_quotes(job_id: Optional[str] = None, pro_id: Optional[str] = None):
+async def get_quotes(job_id: Optional[str] = None, pro_id: Optional[str] = None, sort: str = "newest"):
+    order = quote_sort(sort)
     query = {}
     if job_id:
         query["job_id"] = job_id
     if pro_id:
         query["pro_id"] = pro_id
     
-    quotes = await db.quotes.find(query).sort("created_at", -1).to_list(100)
-    for quote in quotes:
-        quote["_id"] = str(quote["_id"])
+    quotes = await db.quotes.find(query, {"_id": 0}).sort(order).to_list(100)
     return quotes
 
 @api_router.put("/quotes/{quote_id}/status")
@@ -351,26 +484,128 @@ async def update_quote_status(quote_id: str, status: QuoteStatus):
 
 # ============ MESSAGE ROUTES ============
 @api_router.post("/messages")
-async def send_message(message_data: MessageCreate):
-    sender = await db.users.find_one({"id": message_data.sender_id})
-    if not sender:
-        raise HTTPException(status_code=404, detail="Sender not found")
+async def send_message(message_data: MessageCreate, caller: Optional[Dict] = Depends(get_current_user)):
+    check_caller(caller, message_data.sender_id)
+    if caller and caller["sub"] == message_data.sender_id:
+        sender_name = caller["name"]
+    else:
+        sender = await db.users.find_one({"id": message_data.sender_id})
+        if not sender:
+            raise HTTPException(status_code=404, detail="Sender not found")
+        sender_name = sender["name"]
     
     message_dict = message_data.dict()
     message_dict["id"] = str(uuid.uuid4())
-    message_dict["sender_name"] = sender["name"]
+    message_dict["sender_name"] = sender_name
     message_dict["read"] = False
     message_dict["created_at"] = datetime.utcnow()
     
-    await db.messages.insert_one(message_dict)
-    message_dict["_id"] = str(message_dict["_id"])
+    # Count the message before it exists: the insert is what reaches the
+    # receiver (change stream or publish below), and their mark-read must
+    # never subtract before this increment has landed
+    counter = {"user_id": message_dict["receiver_id"], "conversation_id": message_dict["conversation_id"]}
+    await db.unread_counters.update_one(
+        counter,
+        {"$inc": {"unread": 1}, "$set": {"updated_at": message_dict["created_at"]}},
+        upsert=True
+    )
+    try:
+        await db.messages.insert_one(message_dict)
+    except Exception:
+        await db.unread_counters.update_one(counter, {"$inc": {"unread": -1}})
+        raise
+    message_dict.pop("_id")
+    if not transactions_supported:
+        # Without a replica set there is no change stream to pick this up
+        pubsub.publish(f"conversation:{message_dict['conversation_id']}", "message", message_dict, message_dict["id"])
     return {"success": True, "message": message_dict}
 
+@api_router.get("/conversations/{conversation_id}/stream")
+async def stream_conversation(
+    conversation_id: str,
+    user_id: str,
+    token: Optional[str] = None,
+    caller: Optional[Dict] = Depends(get_current_user)
+):
+    """
+    Server-Sent Events feed of new messages in a conversation. EventSource
+    cannot set headers, so the access token may also be passed as ?token=.
+    """
+    if caller is None and token:
+        caller = verify_access_token(token)
+        if caller is None:
+            raise HTTPException(status_code=401, detail="Invalid or expired token")
+    check_caller(caller, user_id)
+    
+    if user_id not in conversation_id.split("_"):
+        participant = await db.messages.find_one(
+            {"conversation_id": conversation_id, "$or": [{"sender_id": user_id}, {"receiver_id": user_id}]},
+            {"_id": 1}
+        )
+        if not participant:
+            raise HTTPException(status_code=403, detail="Not a participant in this conversation")
+    
+    subscriber = pubsub.subscribe(f"conversation:{conversation_id}", "conversation")
+    return StreamingResponse(
+        sse_stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def resolve_message_cursor(conversation_id: str, cursor: str):
+    """A cursor is a message id or an ISO timestamp; returns (created_at, id)"""
+    try:
+        return datetime.fromisoformat(cursor), None
+    except ValueError:
+        pass
+    msg = await db.messages.find_one(
+        {"conversation_id": conversation_id, "id": cursor},
+        {"_id": 0, "created_at": 1, "id": 1}
+    )
+    if not msg:
+        raise HTTPException(status_code=404, detail="Cursor message not found")
+    return msg["created_at"], msg["id"]
+
+def message_cursor_filter(created_at: datetime, msg_id: Optional[str], op: str) -> dict:
+    # Messages sort by (created_at, id); id breaks ties between messages
+    # stored in the same millisecond
+    if msg_id is None:
+        return {"created_at": {op: created_at}}
+    return {"$or": [
+        {"created_at": {op: created_at}},
+        {"created_at": created_at, "id": {op: msg_id}}
+    ]}
+
 @api_router.get("/messages/{conversation_id}")
-async def get_messages(conversation_id: str):
-    messages = await db.messages.find({"conversation_id": conversation_id}).sort("created_at", 1).to_list(1000)
-    for msg in messages:
-        msg["_id"] = str(msg["_id"])
+async def get_messages(
+    conversation_id: str,
+    since: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = 1000
+):
+    """
+    Messages in ascending order. since= returns only messages newer than a
+    message id or timestamp, for delta sync; before= pages backwards through
+    older history, returning the latest `limit` messages before the cursor.
+    """
+    limit = max(1, min(limit, 1000))
+    clauses = [{"conversation_id": conversation_id}]
+    if since:
+        clauses.append(message_cursor_filter(*await resolve_message_cursor(conversation_id, since), "$gt"))
+    if before:
+        clauses.append(message_cursor_filter(*await resolve_message_cursor(conversation_id, before), "$lt"))
+    query = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    
+    if before:
+        messages = await db.messages.find(query, {"_id": 0}).sort(
+            [("created_at", -1), ("id", -1)]
+        ).to_list(limit)
+        messages.reverse()
+        return messages
+    
+    messages = await db.messages.find(query, {"_id": 0}).sort(
+        [("created_at", 1), ("id", 1)]
+    ).to_list(limit)
     return messages
 
 @api_router.get("/conversations/{user_id}")
@@ -395,17 +630,68 @@ async def get_user_conversations(user_id: str):
     
     return list(conversations.values())
 
+@api_router.post("/conversations/{conversation_id}/read")
+async def mark_conversation_read(
+    conversation_id: str,
+    user_id: str,
+    up_to: Optional[str] = None,
+    caller: Optional[Dict] = Depends(get_current_user)
+):
+    """Mark messages received by user_id as read, up to and including message up_to"""
+    check_caller(caller, user_id)
+    query = {"conversation_id": conversation_id, "receiver_id": user_id, "read": False}
+    if up_to:
+        last = await db.messages.find_one(
+            {"id": up_to, "conversation_id": conversation_id}, {"_id": 0, "created_at": 1, "id": 1}
+        )
+        if not last:
+            raise HTTPException(status_code=404, detail="Message not found")
+        # Up to and including up_to in the (created_at, id) order the client
+        # shows, so messages sharing its timestamp are split by id
+        query["$or"] = [
+            {"created_at": {"$lt": last["created_at"]}},
+            {"created_at": last["created_at"], "id": {"$lte": last["id"]}}
+        ]
+    
+    result = await db.messages.update_many(query, {"$set": {"read": True}})
+    if result.modified_count:
+        # Every message is counted before it is inserted, so this cannot run
+        # ahead of its increment; the clamp only covers counters that predate
+        # some of these messages
+        await db.unread_counters.update_one(
+            {"user_id": user_id, "conversation_id": conversation_id},
+            [{"$set": {"unread": {"$max": [0, {"$subtract": ["$unread", result.modified_count]}]}}}]
+        )
+    return {"success": True, "marked_read": result.modified_count}
+
+@api_router.get("/conversations/{user_id}/unread")
+async def get_unread_counts(user_id: str):
+    """Inbox badge counts, served from the maintained counters"""
+    counters = await db.unread_counters.find(
+        {"user_id": user_id, "unread": {"$gt": 0}},
+        {"_id": 0, "conversation_id": 1, "unread": 1}
+    ).to_list(1000)
+    return {
+        "total": sum(c["unread"] for c in counters),
+        "conversations": {c["conversation_id"]: c["unread"] for c in counters}
+    }
+
 # ============ REVIEW ROUTES ============
 @api_router.post("/reviews")
-async def create_review(review_data: ReviewCreate, customer_id: str):
-    customer = await db.users.find_one({"id": customer_id})
-    if not customer:
-        raise HTTPException(status_code=404, detail="Customer not found")
+async def create_review(review_data: ReviewCreate, customer_id: str, caller: Optional[Dict] = Depends(get_current_user)):
+    check_caller(caller, customer_id)
+    if caller and caller["sub"] == customer_id:
+        customer_name = caller["name"]
+    else:
+        customer = await db.users.find_one({"id": customer_id})
+        if not customer:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        customer_name = customer["name"]
     
     review_dict = review_data.dict()
     review_dict["id"] = str(uuid.uuid4())
     review_dict["customer_id"] = customer_id
-    review_dict["customer_name"] = customer["name"]
+    review_dict["customer_name"] = customer_name
     review_dict["created_at"] = datetime.utcnow()
     
     await db.reviews.insert_one(review_dict)
@@ -418,15 +704,14 @@ async def create_review(review_data: ReviewCreate, customer_id: str):
         {"user_id": review_data.pro_id},
         {"$set": {"rating": avg_rating}, "$inc": {"total_jobs": 1}}
     )
+    await pro_profile_changed(review_data.pro_id)
     
-    review_dict["_id"] = str(review_dict["_id"])
+    review_dict.pop("_id")
     return {"success": True, "review": review_dict}
 
 @api_router.get("/reviews/{pro_id}")
 async def get_pro_reviews(pro_id: str):
-    reviews = await db.reviews.find({"pro_id": pro_id}).sort("created_at", -1).to_list(100)
-    for review in reviews:
-        review["_id"] = str(review["_id"])
+    reviews = await db.reviews.find({"pro_id": pro_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
     return reviews
 
 # ============ PAYMENT ROUTES ============
@@ -440,40 +725,103 @@ async def get_payment_packages_public():
         "pro": {"amount": 200.0, "credits": 200.0, "description": "20 leads ($10 each)"},
         "premium": {"amount": 500.0, "credits": 500.0, "description": "50 leads ($10 each)"},
     }
-    logger.info(f"Payment packages endpoint called, returning: {packages}")
     return packages
 
 @api_router.get("/payments/{pro_id}")
 async def get_pro_payments(pro_id: str):
-    payments = await db.payments.find({"pro_id": pro_id}).sort("created_at", -1).to_list(100)
-    for payment in payments:
-        payment["_id"] = str(payment["_id"])
+    payments = await db.payments.find({"pro_id": pro_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
     return payments
 
 @api_router.put("/pros/{pro_id}/budget")
 async def update_weekly_budget(pro_id: str, budget: float):
-    result = await db.pro_profiles.update_one(
-        {"user_id": pro_id},
-        {"$set": {"weekly_budget": budget}}
-    )
-    if result.modified_count == 0:
+    if await set_budget(db, pro_id, budget) is None:
         raise HTTPException(status_code=404, detail="Profile not found")
+    await pro_profile_changed(pro_id)
     return {"success": True}
 
 # ============ ADMIN ROUTES ============
 @api_router.post("/admin/login")
-async def admin_login(email: str, password: str):
-    user = await db.users.find_one({"email": email})
-    if not user or user.get("role") != "admin" or not verify_password(password, user["password"]):
+async def admin_login(request: Request, email: str, password: str):
+    await login_throttle.check(db, request, email)
+    user = await db.users.find_one({"email": email}, {"_id": 0})
+    if not user or user.get("role") != "admin" or not await verify_password(password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid admin credentials")
     
     user.pop("password")
-    user["_id"] = str(user["_id"])
-    return {"success": True, "user": user}
+    return {"success": True, "user": user, "access_token": create_access_token(user)}
+
+@api_router.get("/admin/login-throttle")
+async def get_login_throttle_stats(caller: Optional[Dict] = Depends(get_current_user)):
+    require_admin(caller)
+    stats = login_throttle.stats()
+    if LOGIN_THROTTLE_SHARED:
+        stats["shared_buckets"] = await shared_occupancy(db)
+    return stats
+
+@api_router.get("/admin/compression-stats")
+async def get_compression_stats(caller: Optional[Dict] = Depends(get_current_user)):
+    require_admin(caller)
+    return compression_stats.snapshot()
+
+@api_router.get("/admin/realtime-stats")
+async def get_realtime_stats(caller: Optional[Dict] = Depends(get_current_user)):
+    require_admin(caller)
+    return {**pubsub.stats(), "leads": lead_matcher.stats(), "lead_index": lead_index.stats()}
+
+@api_router.get("/pros/{pro_id}/ledger")
+async def get_credit_ledger(pro_id: str, limit: int = 50, caller: Optional[Dict] = Depends(get_current_user)):
+    check_caller(caller, pro_id)
+    entries = await db.credit_ledger.find({"pro_id": pro_id}, {"_id": 0}).sort("seq", -1).to_list(min(limit, 500))
+    return {"balance": await ledger_balance(db, pro_id), "entries": entries}
+
+@api_router.get("/admin/ledger/verify")
+async def verify_credit_ledgers(caller: Optional[Dict] = Depends(get_current_user)):
+    require_admin(caller)
+    return await verify_ledgers(db)
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(limit: int = 20, caller: Optional[Dict] = Depends(get_current_user)):
+    require_admin(caller)
+    return await slow_query_report(db, min(limit, 200))
+
+@api_router.get("/admin/profile")
+async def profile_process(
+    seconds: float = 10, interval_ms: Optional[float] = None, idle: bool = False,
+    caller: Optional[Dict] = Depends(get_current_user)
+):
+    """Sample this worker's threads for a while and return collapsed stacks for a flamegraph"""
+    require_admin(caller)
+    profile = await profiler.profile(seconds, interval_ms, idle)
+    return Response(content=profile, media_type="text/plain")
+
+@api_router.get("/admin/profile/requests/{profile_id}")
+async def get_request_profile(profile_id: str, caller: Optional[Dict] = Depends(get_current_user)):
+    require_admin(caller)
+    return Response(content=profiler.request_profile(profile_id), media_type="text/plain")
+
+@api_router.post("/admin/memory/snapshots")
+async def take_memory_snapshot(caller: Optional[Dict] = Depends(get_current_user)):
+    """Start tracemalloc if needed and keep a snapshot of live allocations"""
+    require_admin(caller)
+    return await memory_snapshots.take()
+
+@api_router.get("/admin/memory/diff")
+async def diff_memory_snapshots(
+    base: str, target: Optional[str] = None, group_by: str = "route", limit: int = 20,
+    caller: Optional[Dict] = Depends(get_current_user)
+):
+    """Growth from base to target (or to now), grouped by route handler, line, file or traceback"""
+    require_admin(caller)
+    return await memory_snapshots.diff(base, target, app.routes, group_by, min(limit, 200))
+
+@api_router.delete("/admin/memory/snapshots")
+async def stop_memory_tracing(caller: Optional[Dict] = Depends(get_current_user)):
+    require_admin(caller)
+    return memory_snapshots.stop()
 
 @api_router.get("/admin/settings")
 async def get_admin_settings():
-    settings = await db.platform_settings.find_one({})
+    settings = await db.platform_settings.find_one({}, {"_id": 0})
     if not settings:
         # Create default settings if none exist
         default_settings = {
@@ -494,8 +842,8 @@ async def get_admin_settings():
             "updated_at": datetime.utcnow()
         }
         await db.platform_settings.insert_one(default_settings)
+        default_settings.pop("_id")
         settings = default_settings
-    settings["_id"] = str(settings["_id"])
     return settings
 
 @api_router.put("/admin/settings")
@@ -521,17 +869,18 @@ async def get_admin_analytics():
     completed_jobs = await db.jobs.count_documents({"status": "completed"})
     total_quotes = await db.quotes.count_documents({})
     
-    # Calculate revenue
-    payments = await db.payments.find({}).to_list(10000)
-    total_revenue = sum(p["amount"] for p in payments)
-    
-    # Revenue this month
+    # Revenue, summed in MongoDB rather than by loading every payment
     from datetime import datetime, timedelta
     start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    revenue_this_month = sum(
-        p["amount"] for p in payments 
-        if p["created_at"] >= start_of_month
-    )
+    revenue = await db.payments.aggregate([
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": "$amount"},
+            "this_month": {"$sum": {"$cond": [{"$gte": ["$created_at", start_of_month]}, "$amount", 0]}},
+        }}
+    ]).to_list(1)
+    total_revenue = revenue[0]["total"] if revenue else 0
+    revenue_this_month = revenue[0]["this_month"] if revenue else 0
     
     return {
         "total_users": total_users,
@@ -556,14 +905,17 @@ async def get_all_users(role: Optional[str] = None, is_active: Optional[bool] =
     if is_active is not None:
         query["is_active"] = is_active
     
-    users = await db.users.find(query).sort("created_at", -1).to_list(1000)
+    users = await db.users.find(query, {"_id": 0, "password": 0}).sort("created_at", -1).to_list(1000)
+    pro_ids = [user["id"] for user in users if user["role"] == "pro"]
+    profiles = await db.pro_profiles.find(
+        {"user_id": {"$in": pro_ids}},
+        {"_id": 0, "user_id": 1, "weekly_budget": 1, "weekly_spent": 1, "rating": 1, "total_jobs": 1}
+    ).to_list(len(pro_ids))
+    profiles_by_user = {p["user_id"]: p for p in profiles}
     for user in users:
-        user["_id"] = str(user["_id"])
-        user.pop("password", None)
-        
         # Get pro profile info if pro
         if user["role"] == "pro":
-            pro_profile = await db.pro_profiles.find_one({"user_id": user["id"]})
+            pro_profile = profiles_by_user.get(user["id"])
             if pro_profile:
                 user["weekly_budget"] = pro_profile.get("weekly_budget", 0)
                 user["weekly_spent"] = pro_profile.get("weekly_spent", 0)
@@ -574,54 +926,84 @@ async def get_all_users(role: Optional[str] = None, is_active: Optional[bool] =
 
 @api_router.put("/admin/users/{user_id}/status")
 async def update_user_status(user_id: str, data: dict):
+    is_active = data.get("is_active", True)
     result = await db.users.update_one(
         {"id": user_id},
-        {"$set": {"is_active": data.get("is_active", True)}}
+        {"$set": {"is_active": is_active}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    if not is_active:
+        # Outstanding tokens stop working on every worker within one poll interval
+        await revoke_user_sessions(db, user_id)
     return {"success": True}
 
 @api_router.get("/admin/revenue")
 async def get_admin_revenue(period: Optional[str] = "month"):
-    payments = await db.payments.find({}).sort("created_at", -1).to_list(10000)
-    
-    # Calculate totals by type
-    lead_fees = sum(p["amount"] for p in payments if p["payment_type"] == "lead_fee")
-    job_payments = sum(p["amount"] for p in payments if p["payment_type"] == "job_payment")
-    
-    # Group by month
-    from collections import defaultdict
-    monthly_revenue = defaultdict(float)
-    for payment in payments:
-        month_key = payment["created_at"].strftime("%Y-%m")
-        monthly_revenue[month_key] += payment["amount"]
+    # Totals by type and month come from MongoDB; only the 50 most recent
+    # payments are loaded
+    by_type = {"lead_fee": 0, "job_payment": 0}
+    monthly_revenue = {}
+    async for row in db.payments.aggregate([
+        {"$group": {
+            "_id": {
+                "type": "$payment_type",
+                "month": {"$dateToString": {"format": "%Y-%m", "date": "$created_at"}},
+            },
+            "amount": {"$sum": "$amount"},
+        }}
+    ]):
+        payment_type, month_key = row["_id"]["type"], row["_id"]["month"]
+        if payment_type in by_type:
+            by_type[payment_type] += row["amount"]
+        monthly_revenue[month_key] = monthly_revenue.get(month_key, 0) + row["amount"]
+    
+    recent_payments = await db.payments.find(
+        {}, {"_id": 0, "id": 1, "pro_id": 1, "amount": 1, "payment_type": 1, "created_at": 1}
+    ).sort("created_at", -1).to_list(50)
     
     return {
-        "total_revenue": lead_fees + job_payments,
-        "lead_fees": lead_fees,
-        "job_payments": job_payments,
-        "monthly_breakdown": dict(monthly_revenue),
-        "recent_payments": [
-            {
-                "id": p["id"],
-                "pro_id": p["pro_id"],
-                "amount": p["amount"],
-                "payment_type": p["payment_type"],
-                "created_at": p["created_at"],
-                "_id": str(p["_id"])
-            }
-            for p in payments[:50]
-        ]
+        "total_revenue": by_type["lead_fee"] + by_type["job_payment"],
+        "lead_fees": by_type["lead_fee"],
+        "job_payments": by_type["job_payment"],
+        "monthly_breakdown": dict(sorted(monthly_revenue.items(), reverse=True)),
+        "recent_payments": recent_payments
     }
 
+@api_router.get("/admin/export/{collection}")
+async def export_collection(
+    collection: str,
+    format: str = "ndjson",
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    caller: Optional[Dict] = Depends(get_current_user)
+):
+    """
+    Stream a full export of users, payments or transactions as NDJSON or CSV.
+    Rows come straight from a Mongo cursor in chunks, so memory stays flat
+    regardless of collection size. Each row carries a cursor token for
+    resuming an interrupted download.
+    """
+    require_admin(caller)
+    if collection not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid format, expected 'ndjson' or 'csv'")
+    
+    query = build_export_query(created_after, created_before, cursor)
+    filename = f"{collection}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    return StreamingResponse(
+        stream_export(db, collection, format, query),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # ============ SERVICE CATEGORY ROUTES ============
 @api_router.get("/categories")
 async def get_categories(active_only: bool = True):
     query = {"is_active": True} if active_only else {}
-    categories = await db.service_categories.find(query).sort("display_order", 1).to_list(100)
-    for cat in categories:
-        cat["_id"] = str(cat["_id"])
+    categories = await db.service_categories.find(query, {"_id": 0}).sort("display_order", 1).to_list(100)
     return categories
 
 @api_router.post("/admin/categories")
@@ -636,14 +1018,12 @@ async def create_category(category: ServiceCategoryCreate):
     category_dict["created_at"] = datetime.utcnow()
     
     await db.service_categories.insert_one(category_dict)
-    category_dict["_id"] = str(category_dict["_id"])
+    category_dict.pop("_id")
     return {"success": True, "category": category_dict}
 
 @api_router.get("/admin/categories")
 async def get_all_categories_admin():
-    categories = await db.service_categories.find({}).sort("display_order", 1).to_list(100)
-    for cat in categories:
-        cat["_id"] = str(cat["_id"])
+    categories = await db.service_categories.find({}, {"_id": 0}).sort("display_order", 1).to_list(100)
     return categories
 
 @api_router.put("/admin/categories/{category_id}")
@@ -670,6 +1050,81 @@ async def delete_category(category_id: str):
         raise HTTPException(status_code=404, detail="Category not found")
     return {"success": True}
 
+@app.on_event("startup")
+async def ensure_indexes():
+    global transactions_supported
+    hello = await client.admin.command("hello")
+    transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+    for collection, field in ((db.users, "email"), (db.users, "id"), (db.pro_profiles, "user_id")):
+        # One failing index must not stop the others from being built
+        try:
+            await collection.create_index(field, unique=True)
+        except Exception as e:
+            # Existing duplicates must be cleaned up before the index can be built
+            logger.error("Failed to create unique index %s.%s: %s", collection.name, field, e,
+                         extra={"collection": collection.name, "field": field, "error": str(e)})
+    await db.messages.create_index([("conversation_id", 1), ("receiver_id", 1), ("read", 1)])
+    await db.messages.create_index([("conversation_id", 1), ("created_at", 1), ("id", 1)])
+    await db.unread_counters.create_index([("user_id", 1), ("conversation_id", 1)], unique=True)
+    await ensure_quote_indexes(db)
+    await ensure_ledger_indexes(db)
+    await open_ledgers(db)
+    await ensure_budget_reset_indexes(db)
+    await ensure_slow_query_collection(db)
+    slow_query_log.start(db)
+    span_exporter.start()
+    await backfill_quote_ranks(db)
+    await backfill_thumbnails(db)
+
+@app.on_event("startup")
+async def backfill_unread_counters():
+    # Counters start empty on existing deployments; seed them once from the
+    # unread messages already stored
+    if await db.unread_counters.estimated_document_count() > 0:
+        return
+    pipeline = [
+        {"$match": {"read": False}},
+        {"$group": {"_id": {"user_id": "$receiver_id", "conversation_id": "$conversation_id"}, "unread": {"$sum": 1}}},
+    ]
+    async for row in db.messages.aggregate(pipeline):
+        await db.unread_counters.update_one(
+            row["_id"],
+            {"$set": {"unread": row["unread"], "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+@app.on_event("startup")
+async def start_auth_services():
+    await ensure_revocation_index(db)
+    if LOGIN_THROTTLE_SHARED:
+        await ensure_login_bucket_index(db)
+    app.state.revocation_task = asyncio.create_task(poll_revocations(db))
+
+@app.on_event("startup")
+async def start_budget_resets():
+    # Without change streams the lead index does not see the bulk reset
+    on_reset = None if transactions_supported else lambda: load_index(db, lead_index)
+    app.state.budget_reset_task = asyncio.create_task(run_budget_resets(db, on_reset))
+
+@app.on_event("startup")
+async def start_realtime_bridges():
+    await load_index(db, lead_index)
+    stats = lead_index.stats()
+    logger.info("Lead index loaded: %d pros, %d postings", stats["pros"], stats["postings"], extra=stats)
+    app.state.bridge_tasks = []
+    if transactions_supported:
+        app.state.bridge_tasks.append(asyncio.create_task(bridge_collection(
+            db.pro_profiles, lead_index.upsert, operations=("insert", "update", "replace")
+        )))
+        app.state.bridge_tasks.append(asyncio.create_task(bridge_collection(
+            db.messages,
+            lambda doc: pubsub.publish(f"conversation:{doc['conversation_id']}", "message", doc, doc["id"])
+        )))
+        app.state.bridge_tasks.append(asyncio.create_task(bridge_collection(
+            db.jobs,
+            lambda doc: lead_matcher.dispatch(db, doc, job_summary(doc), LEAD_FEE)
+        )))
+
 # Initialize default categories if none exist
 @app.on_event("startup")
 async def initialize_default_categories():
@@ -738,7 +1193,8 @@ async def create_checkout_session(request: Request, package_id: str, pro_id: str
         payment_methods=["card"]  # Supports all cards, Apple Pay, Google Pay
     )
     
-    session: CheckoutSessionResponse = await stripe_checkout.create_checkout_session(checkout_request)
+    with span("stripe.create_checkout_session", KIND_CLIENT, package_id=package_id):
+        session: CheckoutSessionResponse = await stripe_checkout.create_checkout_session(checkout_request)
     
     # Create payment transaction record
     transaction = {
@@ -766,7 +1222,8 @@ async def get_checkout_status(session_id: str, request: Request):
     stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
     
     # Get status from Stripe
-    status: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
+    with span("stripe.get_checkout_status", KIND_CLIENT):
+        status: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
     
     # Check if transaction already processed
     transaction = await db.payment_transactions.find_one({"session_id": session_id})
@@ -792,14 +1249,11 @@ async def get_checkout_status(session_id: str, request: Request):
         credits = transaction["credits"]
         
         # Update pro profile budget
-        await db.pro_profiles.update_one(
-            {"user_id": pro_id},
-            {
-                "$inc": {"weekly_budget": credits}
-            }
-        )
+        await apply_credit(db, pro_id, "credit_purchase", budget_delta=credits, ref=session_id)
+        await pro_profile_changed(pro_id)
         
-        logger.info(f"Added {credits} credits to pro {pro_id} from payment {session_id}")
+        logger.info("Added %s credits to pro %s from payment %s", credits, pro_id, session_id,
+                    extra={"pro_id": pro_id, "credits": credits, "session_id": session_id})
     
     return {
         "status": status.status,
@@ -821,9 +1275,10 @@ async def stripe_webhook(request: Request):
         stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
         
         # Handle webhook
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
+        with span("stripe.handle_webhook", KIND_CLIENT):
+            webhook_response = await stripe_checkout.handle_webhook(body, signature)
         
-        logger.info(f"Webhook received: {webhook_response.event_type} for session {webhook_response.session_id}")
+        logger.info("Webhook received: %s for session %s", webhook_response.event_type, webhook_response.session_id)
         
         # Process based on event type
         if webhook_response.payment_status == "paid":
@@ -847,26 +1302,24 @@ async def stripe_webhook(request: Request):
                 credits = float(webhook_response.metadata.get("credits", 0))
                 
                 if pro_id and credits > 0:
-                    await db.pro_profiles.update_one(
-                        {"user_id": pro_id},
-                        {"$inc": {"weekly_budget": credits}}
+                    await apply_credit(
+                        db, pro_id, "credit_purchase", budget_delta=credits, ref=webhook_response.session_id
                     )
-                    logger.info(f"Webhook: Added {credits} credits to pro {pro_id}")
+                    await pro_profile_changed(pro_id)
+                    logger.info("Webhook: Added %s credits to pro %s", credits, pro_id,
+                                extra={"pro_id": pro_id, "credits": credits})
         
         return {"status": "success"}
     except Exception as e:
-        logger.error(f"Webhook error: {str(e)}")
+        logger.error("Webhook error: %s", e, extra={"error": str(e)})
         raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.get("/payments/history/{pro_id}")
 async def get_payment_history(pro_id: str):
     transactions = await db.payment_transactions.find(
-        {"pro_id": pro_id}
+        {"pro_id": pro_id}, {"_id": 0}
     ).sort("created_at", -1).to_list(100)
     
-    for tx in transactions:
-        tx["_id"] = str(tx["_id"])
-    
     return transactions
 
 # Removed duplicate - packages route now at line 432
@@ -897,10 +1350,8 @@ async def initiate_background_check(data: dict):
         if pro_profile.get("weekly_budget", 0) < background_check_fee:
             raise HTTPException(status_code=400, detail="Insufficient credits")
         
-        await db.pro_profiles.update_one(
-            {"user_id": user_id},
-            {"$inc": {"weekly_budget": -background_check_fee}}
-        )
+        await apply_credit(db, user_id, "background_check", budget_delta=-background_check_fee)
+        await pro_profile_changed(user_id)
         
         # Record transaction
         await db.payment_transactions.insert_one({
@@ -942,7 +1393,7 @@ async def initiate_background_check(data: dict):
         }
     )
     
-    logger.info(f"Background check initiated for pro {user_id}")
+    logger.info("Background check initiated for pro %s", user_id, extra={"pro_id": user_id})
     
     # In real implementation, this would call Checkr API
     # For mock/testing, we'll auto-approve after a delay (or admin can manually approve)
@@ -1003,7 +1454,7 @@ async def connect_google_business(user_id: str, data: dict):
     return {"success": True, "message": "Google Business Profile connected"}
 
     
-    logger.info(f"Background check approved for pro {user_id}")
+    logger.info("Background check approved for pro %s", user_id, extra={"pro_id": user_id})
     
     return {"success": True, "message": "Background check approved"}
 
@@ -1025,7 +1476,7 @@ async def get_background_check_status(user_id: str):
 # ============ ADMIN PAYMENT MANAGEMENT ============
 @api_router.get("/admin/payments/packages")
 async def get_admin_payment_packages():
-    packages = await db.payment_packages.find({}).to_list(100)
+    packages = await db.payment_packages.find({}, {"_id": 0}).to_list(100)
     if not packages:
         # Initialize default packages
         default_packages = [
@@ -1071,10 +1522,10 @@ async def get_admin_payment_packages():
             }
         ]
         await db.payment_packages.insert_many(default_packages)
+        for pkg in default_packages:
+            pkg.pop("_id")
         packages = default_packages
     
-    for pkg in packages:
-        pkg["_id"] = str(pkg["_id"])
     return packages
 
 @api_router.put("/admin/payments/packages/{package_id}")
@@ -1093,16 +1544,20 @@ async def create_payment_package(package_data: dict):
     package_data["id"] = str(uuid.uuid4())
     package_data["created_at"] = datetime.utcnow()
     await db.payment_packages.insert_one(package_data)
-    package_data["_id"] = str(package_data["_id"])
+    package_data.pop("_id")
     return {"success": True, "package": package_data}
 
 @api_router.get("/admin/payments/transactions")
 async def get_all_transactions(limit: int = 100):
-    transactions = await db.payment_transactions.find({}).sort("created_at", -1).to_list(limit)
+    transactions = await db.payment_transactions.find({}, {"_id": 0}).sort("created_at", -1).to_list(limit)
+    pro_ids = list({tx["pro_id"] for tx in transactions})
+    pros = await db.users.find(
+        {"id": {"$in": pro_ids}}, {"_id": 0, "id": 1, "name": 1, "email": 1}
+    ).to_list(len(pro_ids))
+    pros_by_id = {p["id"]: p for p in pros}
     for tx in transactions:
-        tx["_id"] = str(tx["_id"])
         # Get pro name
-        pro = await db.users.find_one({"id": tx["pro_id"]})
+        pro = pros_by_id.get(tx["pro_id"])
         if pro:
             tx["pro_name"] = pro["name"]
             tx["pro_email"] = pro["email"]
@@ -1110,33 +1565,74 @@ async def get_all_transactions(limit: int = 100):
 
 @api_router.get("/admin/payments/stats")
 async def get_payment_stats():
-    # Total revenue
-    transactions = await db.payment_transactions.find({"payment_status": "paid"}).to_list(10000)
-    total_revenue = sum(tx["amount"] for tx in transactions)
-    
-    # Revenue this month
-    from datetime import timedelta
+    # One row per package, summed in MongoDB instead of loading every paid transaction
     start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_transactions = [tx for tx in transactions if tx["created_at"] >= start_of_month]
-    monthly_revenue = sum(tx["amount"] for tx in monthly_transactions)
-    
-    # Package breakdown
+    this_month = {"$gte": ["$created_at", start_of_month]}
+    total_revenue = monthly_revenue = 0
+    total_transactions = monthly_transactions = 0
     package_stats = {}
-    for tx in transactions:
-        pkg = tx.get("package_id", "unknown")
-        package_stats[pkg] = package_stats.get(pkg, 0) + 1
+    async for row in db.payment_transactions.aggregate([
+        {"$match": {"payment_status": "paid"}},
+        {"$group": {
+            "_id": {"$ifNull": ["$package_id", "unknown"]},
+            "count": {"$sum": 1},
+            "amount": {"$sum": "$amount"},
+            "monthly_count": {"$sum": {"$cond": [this_month, 1, 0]}},
+            "monthly_amount": {"$sum": {"$cond": [this_month, "$amount", 0]}},
+        }}
+    ]):
+        package_stats[row["_id"]] = row["count"]
+        total_transactions += row["count"]
+        total_revenue += row["amount"]
+        monthly_transactions += row["monthly_count"]
+        monthly_revenue += row["monthly_amount"]
     
     return {
         "total_revenue": total_revenue,
         "monthly_revenue": monthly_revenue,
-        "total_transactions": len(transactions),
-        "monthly_transactions": len(monthly_transactions),
+        "total_transactions": total_transactions,
+        "monthly_transactions": monthly_transactions,
         "package_breakdown": package_stats,
-        "avg_transaction": total_revenue / len(transactions) if transactions else 0
+        "avg_transaction": total_revenue / total_transactions if total_transactions else 0
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    realtime = pubsub.stats()
+    throttle = login_throttle.stats()
+    gauges = {
+        "password_hash_jobs_pending": passwords.pending_jobs(),
+        "realtime_topics": realtime["topics"],
+        "realtime_queued_events": realtime["queued"],
+        "lead_index_pros": len(lead_index),
+    }
+    for kind, count in realtime["connections"].items():
+        gauges[f"realtime_connections_{kind}"] = count
+    buckets = {"ip": throttle["ip_buckets"], "email": throttle["email_buckets"]}
+    if LOGIN_THROTTLE_SHARED:
+        buckets["shared"] = await shared_occupancy(db)
+    for kind, occupancy in buckets.items():
+        gauges[f"login_throttle_{kind}_buckets_tracked"] = occupancy["tracked"]
+        gauges[f"login_throttle_{kind}_buckets_exhausted"] = occupancy["exhausted"]
+    counters = {
+        "realtime_slow_consumer_disconnects_total": realtime["slow_consumer_disconnects"],
+        "login_throttle_allowed_total": throttle["allowed"],
+        "login_throttle_rejected_total": sum(throttle["rejected"].values()),
+        "log_records_dropped_total": dropped_records(),
     }
+    return Response(content=render_metrics(gauges, counters), media_type=CONTENT_TYPE)
 
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(DBCallMiddleware)
+# Wraps compression, so the recorded latency includes it
+app.add_middleware(MetricsMiddleware)
+# Outermost of ours, so every Mongo call and log line in a request sees its span
+app.add_middleware(TracingMiddleware)
+# Tagged requests are sampled through every middleware above
+app.add_middleware(ProfilingMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1147,4 +1643,11 @@ app.add_middleware(
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.state.revocation_task.cancel()
+    app.state.budget_reset_task.cancel()
+    for task in app.state.bridge_tasks:
+        task.cancel()
     client.close()
+    passwords.shutdown()
+    span_exporter.shutdown()
+    stop_logging()
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+from metrics import current_route
+
+logger = logging.getLogger(__name__)
+
+# Commands at least this slow are logged
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+# Fraction of slow commands that get an explain plan...
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get("SLOW_QUERY_EXPLAIN_SAMPLE", 0.2))
+# ...but at most one per query shape in this window
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 300))
+SLOW_QUERY_COLLECTION_BYTES = int(os.environ.get("SLOW_QUERY_COLLECTION_BYTES", 16 * 1024 * 1024))
+
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Per-operation fields that carry the query; everything else in the command
+# is options
+QUERY_FIELDS = ("filter", "query", "pipeline", "updates", "deletes", "sort")
+# Session and transport fields explain rejects
+_NOT_EXPLAINABLE_FIELDS = {
+    "lsid", "$clusterTime", "$db", "txnNumber", "startTransaction", "autocommit",
+    "$readPreference", "writeConcern", "readConcern", "apiVersion", "apiStrict",
+}
+
+
+def query_shape(value):
+    """The structure of a query with every literal replaced by its type"""
+    if isinstance(value, dict):
+        return {key: query_shape(v) for key, v in value.items()}
+    if isinstance(value, list):
+        shapes = []
+        for item in value:
+            shape = query_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return type(value).__name__
+
+
+def plan_summary(explain: Dict) -> Dict:
+    """Stages and indexes anywhere in an explain result (find or aggregate)"""
+    stages, indexes = set(), set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if isinstance(node.get("stage"), str):
+                stages.add(node["stage"])
+            if isinstance(node.get("indexName"), str):
+                indexes.add(node["indexName"])
+            for key, child in node.items():
+                if key != "rejectedPlans":
+                    walk(child)
+        elif isinstance(node, list):
+            for child in node:
+                walk(child)
+
+    walk(explain.get("queryPlanner", explain))
+    walk(explain.get("stages", []))
+    return {
+        "stages": sorted(stages),
+        "indexes": sorted(indexes),
+        "used_index": bool(indexes) and "COLLSCAN" not in stages,
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """
+    Collects commands slower than SLOW_QUERY_MS, grouped by query shape, and
+    explains a sample of them in the background. Listener callbacks run on
+    Motor's executor threads; the explain is handed back to the event loop.
+    """
+
+    def __init__(self):
+        self.pending: Dict[tuple, tuple] = {}
+        self.shapes: Dict[str, Dict] = {}
+        self.last_explained: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.db = None
+
+    def start(self, db):
+        self.loop = asyncio.get_running_loop()
+        self.db = db
+
+    def started(self, event):
+        if event.command_name == "explain":
+            return
+        with self.lock:
+            self.pending[(event.connection_id, event.request_id)] = (
+                event.command, event.database_name, current_route()
+            )
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        with self.lock:
+            pending = self.pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < SLOW_QUERY_MS:
+            return
+        command, database, route = pending
+        name = event.command_name
+        collection = command.get(name)
+        if not isinstance(collection, str):
+            collection = command.get("collection", "")
+        shape = {field: query_shape(command[field]) for field in QUERY_FIELDS if field in command}
+        key = f"{collection}.{name} {shape}"
+
+        now = time.time()
+        with self.lock:
+            stats = self.shapes.get(key)
+            if stats is None:
+                stats = self.shapes[key] = {
+                    "shape": key, "collection": collection, "command": name,
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": set(),
+                }
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if route:
+                stats["routes"].add(route)
+            explain = (
+                self.loop is not None
+                and name in EXPLAINABLE
+                and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE
+                and now - self.last_explained.get(key, 0) >= SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+            )
+            if explain:
+                self.last_explained[key] = now
+        logger.warning(
+            "Slow query %.0fms on %s.%s from %s", duration_ms, collection, name, route or "background",
+            extra={"duration_ms": duration_ms, "collection": collection, "command": name, "route": route}
+        )
+        if explain:
+            command = {k: v for k, v in command.items() if k not in _NOT_EXPLAINABLE_FIELDS}
+            record = {
+                "shape": key, "collection": collection, "command": name, "route": route,
+                "duration_ms": round(duration_ms, 1),
+            }
+            self.loop.call_soon_threadsafe(self._schedule_explain, database, command, record)
+
+    def _schedule_explain(self, database: str, command: Dict, record: Dict):
+        asyncio.create_task(self._explain(database, command, record))
+
+    async def _explain(self, database: str, command: Dict, record: Dict):
+        try:
+            result = await self.db.client[database].command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+            await self.db.slow_queries.insert_one({
+                **record, **plan_summary(result), "created_at": datetime.utcnow(),
+            })
+        except Exception as e:
+            logger.error("Explain for slow query on %s failed: %s", record["collection"], e,
+                         extra={"collection": record["collection"], "error": str(e)})
+
+    def snapshot(self, limit: int) -> List[Dict]:
+        with self.lock:
+            shapes = [
+                {**stats, "routes": sorted(stats["routes"]), "avg_ms": round(stats["total_ms"] / stats["count"], 1)}
+                for stats in self.shapes.values()
+            ]
+        shapes.sort(key=lambda s: s["max_ms"], reverse=True)
+        return shapes[:limit]
+
+
+slow_query_log = SlowQueryLog()
+
+
+async def ensure_slow_query_collection(db):
+    try:
+        await db.create_collection("slow_queries", capped=True, size=SLOW_QUERY_COLLECTION_BYTES)
+    except CollectionInvalid:
+        pass
+
+
+async def slow_query_report(db, limit: int = 20) -> Dict:
+    """
+    Slowest query shapes seen by this worker, each with the latest explain
+    any worker stored for that shape
+    """
+    shapes = slow_query_log.snapshot(limit)
+    plans = {}
+    async for plan in db.slow_queries.find(
+        {"shape": {"$in": [s["shape"] for s in shapes]}}, {"_id": 0}
+    ).sort("$natural", -1):
+        plans.setdefault(plan["shape"], plan)
+    for shape in shapes:
+        plan = plans.get(shape["shape"])
+        shape["used_index"] = plan["used_index"] if plan else None
+        shape["plan"] = plan
+    return {"threshold_ms": SLOW_QUERY_MS, "shapes": shapes}
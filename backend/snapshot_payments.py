@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Write payments and payment_transactions into month-partitioned Parquet files
+for offline finance analysis, so reporting reads local columnar files instead
+of the production database.
+
+Each run appends only what changed since the previous run. The high-water
+marks are kept next to the data in _high_water_marks.json:
+- payments are append-only, so new rows are those with a larger _id
+- payment_transactions are also updated in place (pending -> paid), so rows
+  whose updated_at moved past the previous run are exported again. Readers
+  should keep the row with the latest snapshot_at for each doc_id.
+
+Usage:
+    python snapshot_payments.py --out /data/finance
+    python snapshot_payments.py --out /data/finance --full   # ignore marks
+
+Layout:
+    <out>/payments/month=2025-01/part-20250201T000000000000-0000.parquet
+    <out>/payment_transactions/month=2025-01/part-20250201T000000000000-0000.parquet
+"""
+
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("snapshot_payments")
+
+# Rows held in memory before a batch is written out
+BATCH_ROWS = 50000
+STATE_FILE = "_high_water_marks.json"
+COLLECTIONS = ("payments", "payment_transactions")
+
+_TIMESTAMP = pa.timestamp("us", tz="UTC")
+# One fixed schema per collection. Every part file is written with it, so a
+# column that is empty or absent in one batch still has the same type as in
+# the others and the whole directory reads back as one dataset. Fields not
+# listed here are dropped.
+SCHEMAS = {
+    "payments": pa.schema([
+        ("doc_id", pa.string()),
+        ("id", pa.string()),
+        ("pro_id", pa.string()),
+        ("job_id", pa.string()),
+        ("amount", pa.float64()),
+        ("payment_type", pa.string()),
+        ("status", pa.string()),
+        ("created_at", _TIMESTAMP),
+        ("snapshot_at", _TIMESTAMP),
+    ]),
+    "payment_transactions": pa.schema([
+        ("doc_id", pa.string()),
+        ("id", pa.string()),
+        ("session_id", pa.string()),
+        ("pro_id", pa.string()),
+        ("package_id", pa.string()),
+        ("amount", pa.float64()),
+        ("credits", pa.float64()),
+        ("currency", pa.string()),
+        ("payment_status", pa.string()),
+        ("status", pa.string()),
+        ("payment_type", pa.string()),
+        ("payment_method", pa.string()),
+        ("metadata", pa.string()),
+        ("created_at", _TIMESTAMP),
+        ("updated_at", _TIMESTAMP),
+        ("snapshot_at", _TIMESTAMP),
+    ]),
+}
+
+
+def load_marks(out_dir: Path) -> dict:
+    path = out_dir / STATE_FILE
+    if path.exists():
+        return json.loads(path.read_text())
+    return {}
+
+
+def save_marks(out_dir: Path, marks: dict):
+    # Write then rename so a crash never leaves a half-written state file
+    tmp = out_dir / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(marks, indent=2))
+    tmp.replace(out_dir / STATE_FILE)
+
+
+def build_query(collection: str, mark: dict) -> dict:
+    if not mark:
+        return {}
+    clauses = [{"_id": {"$gt": ObjectId(mark["last_id"])}}]
+    if collection == "payment_transactions" and mark.get("last_run"):
+        clauses.append({"updated_at": {"$gt": datetime.fromisoformat(mark["last_run"])}})
+    return {"$or": clauses} if len(clauses) > 1 else clauses[0]
+
+
+def _to_string(value):
+    # Nested documents (Stripe metadata) become JSON strings
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return str(value)
+
+
+def to_frame(collection: str, docs: list, snapshot_at: datetime) -> pd.DataFrame:
+    schema = SCHEMAS[collection]
+    df = pd.DataFrame(docs)
+    df["doc_id"] = df.pop("_id").astype(str)
+    df["snapshot_at"] = pd.Timestamp(snapshot_at, tz="UTC")
+    # Fields missing from every document in this batch become empty columns
+    df = df.reindex(columns=schema.names)
+    for field in schema:
+        if field.type == _TIMESTAMP:
+            # created_at is a datetime for most rows but an ISO string for
+            # background check charges; normalise both to UTC timestamps
+            df[field.name] = pd.to_datetime(df[field.name], utc=True, errors="coerce", format="mixed")
+        elif field.type == pa.float64():
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce").astype(np.float64)
+        else:
+            df[field.name] = df[field.name].astype(object).map(_to_string)
+    return df
+
+
+def write_batch(out_dir: Path, collection: str, df: pd.DataFrame, run_tag: str, batch_no: int) -> int:
+    months = df["created_at"].dt.strftime("%Y-%m").fillna("unknown")
+    for month, part in df.groupby(months):
+        part_dir = out_dir / collection / f"month={month}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        part.to_parquet(part_dir / f"part-{run_tag}-{batch_no:04d}.parquet", index=False,
+                        schema=SCHEMAS[collection])
+    return len(df)
+
+
+def snapshot_collection(db, out_dir: Path, collection: str, mark: dict, snapshot_at: datetime) -> dict:
+    run_tag = snapshot_at.strftime("%Y%m%dT%H%M%S%f")
+    cursor = db[collection].find(build_query(collection, mark)).sort("_id", 1).batch_size(5000)
+
+    last_id = mark.get("last_id")
+    written = 0
+    batch, batch_no = [], 0
+    for doc in cursor:
+        if last_id is None or doc["_id"] > ObjectId(last_id):
+            last_id = str(doc["_id"])
+        batch.append(doc)
+        if len(batch) >= BATCH_ROWS:
+            written += write_batch(out_dir, collection, to_frame(collection, batch, snapshot_at), run_tag, batch_no)
+            batch, batch_no = [], batch_no + 1
+    if batch:
+        written += write_batch(out_dir, collection, to_frame(collection, batch, snapshot_at), run_tag, batch_no)
+
+    logger.info("%s: wrote %d rows", collection, written)
+    if last_id is None:
+        return mark
+    return {"last_id": last_id, "last_run": snapshot_at.isoformat()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot payments into Parquet")
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--full", action="store_true", help="Ignore high-water marks and export everything")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    marks = {} if args.full else load_marks(out_dir)
+
+    client = MongoClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    snapshot_at = datetime.utcnow()
+    try:
+        for collection in COLLECTIONS:
+            marks[collection] = snapshot_collection(db, out_dir, collection, marks.get(collection, {}), snapshot_at)
+            # Persist after each collection so a crash only repeats unfinished work
+            save_marks(out_dir, marks)
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from pymongo import ReturnDocument
+
+# Burst size and refill rate (attempts per second) for each bucket type
+LOGIN_EMAIL_BURST = float(os.environ.get("LOGIN_EMAIL_BURST", 5))
+LOGIN_EMAIL_RATE = float(os.environ.get("LOGIN_EMAIL_RATE", 5 / 60))
+LOGIN_IP_BURST = float(os.environ.get("LOGIN_IP_BURST", 20))
+LOGIN_IP_RATE = float(os.environ.get("LOGIN_IP_RATE", 1))
+# Share buckets across workers through the login_buckets collection
+LOGIN_THROTTLE_SHARED = os.environ.get("LOGIN_THROTTLE_SHARED", "false").lower() == "true"
+# Proxies in front of the app; the client address is read that many hops
+# from the right of X-Forwarded-For so clients cannot spoof it
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 1))
+# Hard cap on in-memory buckets per set; the least recently used go first
+MAX_LOCAL_BUCKETS = 100000
+
+
+def client_ip(request: Request) -> str:
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded and TRUSTED_PROXY_HOPS > 0:
+        hops = [h.strip() for h in forwarded.split(",")]
+        return hops[max(0, len(hops) - TRUSTED_PROXY_HOPS)]
+    return request.client.host if request.client else "unknown"
+
+
+class TokenBucketSet:
+    """
+    In-memory token buckets keyed by string, refilled lazily on access.
+    Buckets are kept in order of last use, so the ones idle long enough to
+    refill sit at the front and eviction never scans the whole set.
+    """
+
+    def __init__(self, burst: float, rate: float):
+        self.burst = burst
+        self.rate = rate
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated]
+
+    def take(self, key: str, now: Optional[float] = None) -> bool:
+        now = now if now is not None else time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.prune(now)
+            bucket = self.buckets[key] = [self.burst, now]
+        else:
+            self.buckets.move_to_end(key)
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def prune(self, now: float):
+        # A bucket idle long enough to refill completely is the same as no
+        # bucket. Each one is popped once, so this is O(1) amortised.
+        full_after = self.burst / self.rate
+        while self.buckets and now - next(iter(self.buckets.values()))[1] >= full_after:
+            self.buckets.popitem(last=False)
+        # Under a flood of distinct keys nothing has refilled yet; forget the
+        # least recently used rather than grow without bound
+        while len(self.buckets) >= MAX_LOCAL_BUCKETS:
+            self.buckets.popitem(last=False)
+
+    def occupancy(self, now: Optional[float] = None) -> Dict:
+        now = now if now is not None else time.monotonic()
+        empty = sum(
+            1 for tokens, updated in self.buckets.values()
+            if tokens + (now - updated) * self.rate < 1
+        )
+        return {"tracked": len(self.buckets), "exhausted": empty}
+
+
+class LoginThrottle:
+    """
+    Rejects login attempts that exceed the per-IP or per-email budget.
+    Runs before any password verification, so rejected attempts cost no
+    bcrypt work.
+    """
+
+    def __init__(self):
+        self.ip_buckets = TokenBucketSet(LOGIN_IP_BURST, LOGIN_IP_RATE)
+        self.email_buckets = TokenBucketSet(LOGIN_EMAIL_BURST, LOGIN_EMAIL_RATE)
+        self.allowed = 0
+        self.rejected = {"ip": 0, "email": 0}
+
+    async def _take_shared(self, db, key: str, burst: float, rate: float) -> bool:
+        # Same refill rule as TokenBucketSet, applied atomically in Mongo
+        now = time.time()
+        refilled = {"$min": [burst, {"$add": [
+            {"$ifNull": ["$tokens", burst]},
+            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate]}
+        ]}]}
+        doc = await db.login_buckets.find_one_and_update(
+            {"key": key},
+            [
+                {"$set": {"tokens": refilled}},
+                {"$set": {
+                    "allowed": {"$gte": ["$tokens", 1]},
+                    "tokens": {"$cond": [{"$gte": ["$tokens", 1]}, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "updated": now,
+                    "expires_at": datetime.utcnow() + timedelta(seconds=burst / rate),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["allowed"]
+
+    async def check(self, db, request: Request, email: str):
+        ip = client_ip(request)
+        email = email.strip().lower()
+        for kind, key, buckets in (("ip", ip, self.ip_buckets), ("email", email, self.email_buckets)):
+            if LOGIN_THROTTLE_SHARED:
+                ok = await self._take_shared(db, f"{kind}:{key}", buckets.burst, buckets.rate)
+            else:
+                ok = buckets.take(key)
+            if not ok:
+                self.rejected[kind] += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many login attempts, please try again later",
+                    headers={"Retry-After": str(int(1 / buckets.rate) or 1)}
+                )
+        self.allowed += 1
+
+    def stats(self) -> Dict:
+        return {
+            "shared": LOGIN_THROTTLE_SHARED,
+            "allowed": self.allowed,
+            "rejected": dict(self.rejected),
+            "ip_buckets": self.ip_buckets.occupancy(),
+            "email_buckets": self.email_buckets.occupancy(),
+        }
+
+
+async def shared_occupancy(db) -> Dict:
+    """Buckets in the shared login_buckets collection, and those whose last attempt was refused"""
+    return {
+        "tracked": await db.login_buckets.count_documents({}),
+        "exhausted": await db.login_buckets.count_documents({"allowed": False}),
+    }
+
+
+async def ensure_login_bucket_index(db):
+    await db.login_buckets.create_index("key", unique=True)
+    await db.login_buckets.create_index("expires_at", expireAfterSeconds=0)
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,46 @@
+import asyncio
+import base64
+import binascii
+import io
+import os
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+# Longest side of the job card thumbnail, in pixels
+THUMBNAIL_SIZE = int(os.environ.get("THUMBNAIL_SIZE", 320))
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", 70))
+
+
+def make_thumbnail(image: str) -> Optional[str]:
+    """
+    A small JPEG data URL for a job card, from an uploaded base64 data URL.
+    Plain URLs are returned as they are; unreadable images give None.
+    """
+    if not image.startswith("data:"):
+        return image
+    try:
+        encoded = image.split(",", 1)[1]
+        with Image.open(io.BytesIO(base64.b64decode(encoded, validate=True))) as source:
+            # Phone photos are often stored sideways with an EXIF rotation
+            thumbnail = ImageOps.exif_transpose(source).convert("RGB")
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        out = io.BytesIO()
+        thumbnail.save(out, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    except (IndexError, binascii.Error, OSError, Image.DecompressionBombError):
+        return None
+    return "data:image/jpeg;base64," + base64.b64encode(out.getvalue()).decode()
+
+
+async def job_thumbnail(images) -> Optional[str]:
+    # Decoding a full-size photo takes tens of milliseconds; keep it off the event loop
+    return await asyncio.to_thread(make_thumbnail, images[0]) if images else None
+
+
+async def backfill_thumbnails(db):
+    """Store thumbnails for jobs created before they were generated"""
+    async for job in db.jobs.find(
+        {"thumbnail": {"$exists": False}, "images.0": {"$exists": True}},
+        {"_id": 0, "id": 1, "images": {"$slice": 1}}
+    ):
+        await db.jobs.update_one({"id": job["id"]}, {"$set": {"thumbnail": await job_thumbnail(job["images"])}})
@@ -0,0 +1,297 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from pymongo import monitoring
+from starlette.datastructures import Headers, MutableHeaders
+
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+# "" (off), "file" (OTLP JSON lines in TRACE_FILE) or "otlp" (OTLP/HTTP JSON)
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.environ.get("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+# Fraction of requests without an incoming sampled traceparent that are traced
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 1.0))
+TRACE_SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "qozii-api")
+TRACE_FLUSH_SECONDS = float(os.environ.get("TRACE_FLUSH_SECONDS", 2))
+# Finished spans held for export before new ones are dropped
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", 20000))
+
+# OTLP SpanKind / StatusCode values
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "status", "status_message")
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str],
+                 attributes: Optional[Dict] = None, start_ns: Optional[int] = None):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    def child(self, name: str, kind: int = KIND_INTERNAL, **attributes) -> "Span":
+        return Span(name, kind, self.trace_id, self.span_id, attributes)
+
+    def fail(self, message: str):
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    def end(self, end_ns: Optional[int] = None):
+        self.end_ns = end_ns or time.time_ns()
+        exporter.add(self)
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+            "status": {"code": self.status, "message": self.status_message},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _attribute(key: str, value) -> Dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+# Span of the code currently running; None when the request is not traced
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def trace_ids() -> Optional[tuple]:
+    span = current_span.get()
+    return (span.trace_id, span.span_id) if span is not None else None
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """Time a block as a child of the current span; a no-op outside traced requests"""
+    parent = current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.child(name, kind, **attributes)
+    token = current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        current_span.reset(token)
+        child.end()
+
+
+class SpanExporter:
+    """
+    Buffers finished spans and writes them in OTLP JSON batches from a
+    background thread, so request handling never waits on export I/O.
+    """
+
+    def __init__(self):
+        self.buffer: deque = deque(maxlen=TRACE_BUFFER_SIZE)
+        self.wake = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = False
+        self.exported = 0
+        self.failures = 0
+
+    def add(self, finished: Span):
+        self.buffer.append(finished)
+        if len(self.buffer) >= 512:
+            self.wake.set()
+
+    def start(self):
+        if TRACE_EXPORTER and self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self.thread.start()
+
+    def shutdown(self):
+        if self.thread is not None:
+            self.stopped = True
+            self.wake.set()
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _run(self):
+        while not self.stopped:
+            self.wake.wait(TRACE_FLUSH_SECONDS)
+            self.wake.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        spans: List[Span] = []
+        while self.buffer:
+            spans.append(self.buffer.popleft())
+        if not spans:
+            return
+        payload = dumps({"resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "qozii"}, "spans": [s.to_otlp() for s in spans]}],
+        }]})
+        try:
+            if TRACE_EXPORTER == "otlp":
+                # Only the OTLP exporter needs an HTTP client
+                import requests
+                response = requests.post(
+                    OTLP_ENDPOINT, data=payload, headers={"Content-Type": "application/json"}, timeout=5
+                )
+                response.raise_for_status()
+            else:
+                with open(TRACE_FILE, "ab") as f:
+                    f.write(payload + b"\n")
+            self.exported += len(spans)
+        except Exception as e:
+            self.failures += 1
+            logger.error("Span export failed: %s", e, extra={"error": str(e), "spans": len(spans)})
+
+
+exporter = SpanExporter()
+
+
+def _is_hex(value: str, length: int) -> bool:
+    return len(value) == length and all(c in "0123456789abcdef" for c in value)
+
+
+def _parse_traceparent(value: str) -> Optional[tuple]:
+    """(trace id, parent span id, sampled) from a W3C traceparent, or None to start a new trace"""
+    # version-traceid-parentid-flags; later versions may append fields
+    parts = value.strip().split("-")
+    if len(parts) < 4 or not _is_hex(parts[0], 2) or parts[0] == "ff":
+        return None
+    if parts[0] == "00" and len(parts) != 4:
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if not (_is_hex(trace_id, 32) and _is_hex(parent_id, 16) and _is_hex(flags, 2)):
+        return None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, int(flags, 16) & 1 == 1
+
+
+class TracingMiddleware:
+    """
+    Opens a server span per request, continuing the caller's trace when a
+    W3C traceparent header is present, and returns the trace id in
+    X-Trace-Id. Does nothing unless TRACE_EXPORTER is set.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACE_EXPORTER:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = _parse_traceparent(Headers(scope=scope).get("traceparent", ""))
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < TRACE_SAMPLE_RATE
+        if not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        server_span = Span(scope["method"], KIND_SERVER, trace_id, parent_id, {
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        })
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                server_span.attributes["http.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    server_span.fail(f"HTTP {message['status']}")
+                MutableHeaders(scope=message)["X-Trace-Id"] = trace_id
+            await send(message)
+
+        token = current_span.set(server_span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            server_span.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                server_span.name = f"{scope['method']} {route.path}"
+                server_span.attributes["http.route"] = route.path
+            server_span.end()
+
+
+class MongoTracer(monitoring.CommandListener):
+    """A client span per Mongo command issued inside a traced request"""
+
+    def __init__(self):
+        self.pending: Dict[tuple, Span] = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        parent = current_span.get()
+        if parent is None:
+            return
+        collection = event.command.get(event.command_name)
+        child = parent.child(
+            f"mongodb.{event.command_name}", KIND_CLIENT,
+            **{
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": collection if isinstance(collection, str) else None,
+            }
+        )
+        with self.lock:
+            self.pending[(event.connection_id, event.request_id)] = child
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get("errmsg", "failed")) if isinstance(event.failure, dict) else "failed")
+
+    def _finish(self, event, error: Optional[str]):
+        with self.lock:
+            child = self.pending.pop((event.connection_id, event.request_id), None)
+        if child is None:
+            return
+        if error:
+            child.fail(error)
+        child.end(child.start_ns + event.duration_micros * 1000)
+
+
+mongo_tracer = MongoTracer()
@@ -1,10 +1,19 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
 import axios from 'axios';
+import apiClient from '../services/api';
 
 const AuthContext = createContext();
 
 const API_URL = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
+const setAuthToken = (token) => {
+  if (token) {
+    axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+  } else {
+    delete axios.defaults.headers.common['Authorization'];
+  }
+};
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -12,7 +21,9 @@ export const AuthProvider = ({ children }) => {
   useEffect(() => {
     const storedUser = localStorage.getItem('user');
     if (storedUser) {
-      setUser(JSON.parse(storedUser));
+      const parsedUser = JSON.parse(storedUser);
+      setAuthToken(parsedUser.token);
+      setUser(parsedUser);
     }
     setLoading(false);
   }, []);
@@ -22,7 +33,8 @@ export const AuthProvider = ({ children }) => {
       const response = await axios.post(`${API_URL}/users/login`, null, {
         params: { email, password }
       });
-      const userData = response.data.user;
+      const userData = { ...response.data.user, token: response.data.access_token };
+      setAuthToken(userData.token);
       setUser(userData);
       localStorage.setItem('user', JSON.stringify(userData));
       return { success: true };
@@ -34,7 +46,8 @@ export const AuthProvider = ({ children }) => {
   const register = async (userData) => {
     try {
       const response = await axios.post(`${API_URL}/users/register`, userData);
-      const newUser = response.data.user;
+      const newUser = { ...response.data.user, token: response.data.access_token };
+      setAuthToken(newUser.token);
       setUser(newUser);
       localStorage.setItem('user', JSON.stringify(newUser));
       return { success: true };
@@ -45,9 +58,28 @@ export const AuthProvider = ({ children }) => {
 
   const logout = () => {
     setUser(null);
+    setAuthToken(null);
     localStorage.removeItem('user');
   };
 
+  // Access tokens expire after an hour and there is no refresh endpoint, so
+  // a 401 on a request that carried a token ends the session; the protected
+  // routes then send the user back to the login page
+  useEffect(() => {
+    const onError = (error) => {
+      if (error.response?.status === 401 && error.config?.headers?.Authorization) {
+        logout();
+      }
+      return Promise.reject(error);
+    };
+    const axiosInterceptor = axios.interceptors.response.use(null, onError);
+    const clientInterceptor = apiClient.interceptors.response.use(null, onError);
+    return () => {
+      axios.interceptors.response.eject(axiosInterceptor);
+      apiClient.interceptors.response.eject(clientInterceptor);
+    };
+  }, []);
+
   return (
     <AuthContext.Provider value={{ user, login, register, logout, loading }}>
       {children}
@@ -13,12 +13,16 @@ const JobDetails = () => {
   const [job, setJob] = useState(null);
   const [quotes, setQuotes] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [sort, setSort] = useState('best');
 
   useEffect(() => {
     fetchJobDetails();
-    fetchQuotes();
   }, [jobId]);
 
+  useEffect(() => {
+    fetchQuotes();
+  }, [jobId, sort]);
+
   const fetchJobDetails = async () => {
     try {
       const response = await axios.get(`${API_URL}/jobs/${jobId}`);
@@ -32,7 +36,7 @@ const JobDetails = () => {
 
   const fetchQuotes = async () => {
     try {
-      const response = await axios.get(`${API_URL}/quotes?job_id=${jobId}`);
+      const response = await axios.get(`${API_URL}/quotes?job_id=${jobId}&sort=${sort}`);
       setQuotes(response.data);
     } catch (error) {
       console.error('Error fetching quotes:', error);
@@ -83,7 +87,20 @@ const JobDetails = () => {
         </div>
 
         <div>
-          <h2 className="text-2xl font-bold text-gray-900 mb-4">Quotes ({quotes.length})</h2>
+          <div className="flex justify-between items-center mb-4">
+            <h2 className="text-2xl font-bold text-gray-900">Quotes ({quotes.length})</h2>
+            <select
+              value={sort}
+              onChange={(e) => setSort(e.target.value)}
+              className="border border-gray-300 rounded-lg px-3 py-2 text-sm"
+            >
+              <option value="best">Best match</option>
+              <option value="price">Lowest price</option>
+              <option value="rating">Highest rated</option>
+              <option value="fastest">Fastest</option>
+              <option value="newest">Newest</option>
+            </select>
+          </div>
           {quotes.length === 0 ? (
             <div className="bg-white rounded-xl p-12 text-center">
               <p className="text-gray-600">No quotes yet. Pros will start sending quotes soon!</p>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate, useLocation } from 'react-router-dom';
 import { useAuth } from '../../context/AuthContext';
 import axios from 'axios';
@@ -18,6 +18,7 @@ const Messages = () => {
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(true);
   const [sending, setSending] = useState(false);
+  const lastMessageId = useRef(null);
 
   // Check if coming from a specific pro/job
   const queryParams = new URLSearchParams(location.search);
@@ -30,11 +31,21 @@ const Messages = () => {
 
   useEffect(() => {
     if (selectedConversation) {
+      lastMessageId.current = null;
       fetchMessages(selectedConversation);
-      const interval = setInterval(() => {
-        fetchMessages(selectedConversation);
-      }, 3000); // Poll every 3 seconds
-      return () => clearInterval(interval);
+      // New messages are pushed over Server-Sent Events instead of polling
+      const params = new URLSearchParams({ user_id: user.id });
+      if (user.token) params.set('token', user.token);
+      const source = new EventSource(`${API_URL}/conversations/${selectedConversation}/stream?${params}`);
+      source.addEventListener('message', (event) => {
+        const message = JSON.parse(event.data);
+        setMessages((prev) => (prev.some((m) => m.id === message.id) ? prev : [...prev, message]));
+        if (message.receiver_id === user.id) markRead(selectedConversation, message.id);
+      });
+      // Catch up on anything missed while disconnected or after falling behind
+      source.addEventListener('resync', () => fetchNewMessages(selectedConversation));
+      source.onopen = () => fetchNewMessages(selectedConversation);
+      return () => source.close();
     }
   }, [selectedConversation]);
 
@@ -61,11 +72,42 @@ const Messages = () => {
     try {
       const response = await axios.get(`${API_URL}/messages/${conversationId}`);
       setMessages(response.data);
+      markRead(conversationId);
     } catch (error) {
       console.error('Error fetching messages:', error);
     }
   };
 
+  useEffect(() => {
+    lastMessageId.current = messages.length > 0 ? messages[messages.length - 1].id : null;
+  }, [messages]);
+
+  // Delta sync: only transfer messages newer than the last one we have
+  const fetchNewMessages = async (conversationId) => {
+    if (!lastMessageId.current) return fetchMessages(conversationId);
+    try {
+      const response = await axios.get(`${API_URL}/messages/${conversationId}`, {
+        params: { since: lastMessageId.current }
+      });
+      if (response.data.length > 0) {
+        setMessages((prev) => [...prev, ...response.data.filter((m) => !prev.some((p) => p.id === m.id))]);
+        markRead(conversationId);
+      }
+    } catch (error) {
+      console.error('Error fetching new messages:', error);
+    }
+  };
+
+  const markRead = async (conversationId, upTo) => {
+    try {
+      await axios.post(`${API_URL}/conversations/${conversationId}/read`, null, {
+        params: { user_id: user.id, ...(upTo ? { up_to: upTo } : {}) }
+      });
+    } catch (error) {
+      console.error('Error marking messages read:', error);
+    }
+  };
+
   const handleSendMessage = async (e) => {
     e.preventDefault();
     if (!newMessage.trim() || !selectedConversation) return;
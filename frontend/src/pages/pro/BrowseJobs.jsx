@@ -31,6 +31,22 @@ const BrowseJobs = () => {
     fetchJobs();
   }, [filters]);
 
+  // Matching leads are pushed as soon as they are posted
+  useEffect(() => {
+    if (!user) return;
+    const params = new URLSearchParams();
+    if (user.token) params.set('token', user.token);
+    const source = new EventSource(`${API_URL}/pros/${user.id}/leads/stream?${params}`);
+    source.addEventListener('lead', (event) => {
+      const job = JSON.parse(event.data);
+      if (filters.category && job.category !== filters.category) return;
+      if (filters.location && job.zipcode !== filters.location) return;
+      setJobs((prev) => (prev.some((j) => j.id === job.id) ? prev : [job, ...prev]));
+    });
+    source.addEventListener('resync', () => fetchJobs());
+    return () => source.close();
+  }, [user, filters]);
+
   const fetchJobs = async () => {
     try {
       let url = `${API_URL}/jobs?status=open`;
@@ -115,9 +131,9 @@ const BrowseJobs = () => {
                 onClick={() => navigate(`/job/${job.id}`)}
                 className="bg-white rounded-xl shadow-lg hover:shadow-xl transition-all duration-300 cursor-pointer overflow-hidden"
               >
-                {job.images && job.images.length > 0 && (
+                {job.thumbnail && (
                   <img
-                    src={job.images[0]}
+                    src={job.thumbnail}
                     alt={job.title}
                     className="w-full h-48 object-cover"
                   />
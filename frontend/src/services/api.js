@@ -11,6 +11,17 @@ const apiClient = axios.create({
   },
 });
 
+// Instances copy axios defaults when created, so the token AuthContext sets
+// later never reaches this one; read it from the stored session instead
+apiClient.interceptors.request.use((config) => {
+  const storedUser = localStorage.getItem('user');
+  const token = storedUser ? JSON.parse(storedUser).token : null;
+  if (token) {
+    config.headers.Authorization = `Bearer ${token}`;
+  }
+  return config;
+});
+
 // ============ USER AUTHENTICATION ============
 export const registerUser = async (userData) => {
   try {
@@ -0,0 +1,56 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "qozii_test")
+# Every response reports its database round trips
+os.environ["DB_CALL_HEADERS"] = "true"
+
+
+@pytest.fixture(scope="session")
+def mongo():
+    """Scratch database, dropped before and after the session"""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB is not reachable at MONGO_URL")
+    client.drop_database(os.environ["DB_NAME"])
+    yield client[os.environ["DB_NAME"]]
+    client.drop_database(os.environ["DB_NAME"])
+    client.close()
+
+
+@pytest.fixture(scope="session")
+def api(mongo):
+    pytest.importorskip("emergentintegrations")
+    from fastapi.testclient import TestClient
+
+    import server
+
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def assert_db_calls():
+    """
+    assert_db_calls(response, n) fails when the request behind response
+    made more than n database round trips, e.g. a find_one per row.
+    """
+    def check(response, expected: int):
+        assert response.status_code < 400, response.text
+        calls = int(response.headers["X-DB-Calls"])
+        assert calls <= expected, (
+            f"{response.request.method} {response.request.url.path} made {calls} "
+            f"database calls ({response.headers['X-DB-Time-Ms']}ms), expected at most {expected}"
+        )
+    return check
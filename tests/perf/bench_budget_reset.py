@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark the weekly budget reset over a large pro population. Seeds
+synthetic pro profiles across several time zones into a scratch database,
+runs one full reset zone by zone, and meanwhile charges lead fees on
+random pros to show quote submissions keep flowing while the reset runs.
+Reports overall and per-zone reset throughput.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python tests/perf/bench_budget_reset.py
+    BENCH_PROS=500000 BUDGET_RESET_BATCH_SIZE=2000 python tests/perf/bench_budget_reset.py
+    BENCH_JSON=budget_reset.json python tests/perf/bench_budget_reset.py   # also save results
+"""
+
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+from budget_reset import DEFAULT_TIME_ZONE, ensure_budget_reset_indexes, reset_zone  # noqa: E402
+from ledger import apply_credit, ensure_ledger_indexes, verify_ledgers  # noqa: E402
+
+PRO_COUNT = int(os.environ.get("BENCH_PROS", 500_000))
+# Optional path the results are also written to as JSON
+RESULTS_PATH = os.environ.get("BENCH_JSON")
+ZONES = [None, "America/New_York", "America/Denver", "America/Los_Angeles", "America/Phoenix", "Pacific/Honolulu"]
+LAST_WEEK = datetime.utcnow() - timedelta(days=8)
+
+
+def make_pro(rng):
+    return {
+        "user_id": str(uuid.uuid4()),
+        "services": ["handyman"],
+        "weekly_budget": 200.0,
+        "weekly_spent": float(rng.choice([0, 10, 50, 120])),
+        "budget_active": True,
+        "ledger_seq": 0,
+        "time_zone": rng.choice(ZONES),
+        "budget_week_start": LAST_WEEK,
+        "created_at": datetime.utcnow(),
+    }
+
+
+async def charge_while_running(db, pro_ids, done: asyncio.Event, timings):
+    rng = random.Random(1)
+    while not done.is_set():
+        start = time.perf_counter()
+        await apply_credit(db, rng.choice(pro_ids), "lead_fee", spent_delta=10.0)
+        timings.append((time.perf_counter() - start) * 1000)
+
+
+async def reset_by_zone(db):
+    """What reset_weekly_budgets does, timing each zone separately"""
+    now = datetime.utcnow()
+    zones = {DEFAULT_TIME_ZONE} | {z for z in await db.pro_profiles.distinct("time_zone") if z}
+    results = {}
+    for zone in sorted(zones):
+        start = time.perf_counter()
+        count = await reset_zone(db, zone, now)
+        results[zone] = (count, time.perf_counter() - start)
+    return results
+
+
+async def main():
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("BENCH_DB_NAME", "qozii_bench")]
+    for name in ("pro_profiles", "credit_ledger", "ledger_snapshots"):
+        await db[name].drop()
+    await db.pro_profiles.create_index("user_id", unique=True)
+    await ensure_ledger_indexes(db)
+    await ensure_budget_reset_indexes(db)
+
+    rng = random.Random(42)
+    pro_ids = []
+    for offset in range(0, PRO_COUNT, 10_000):
+        batch = [make_pro(rng) for _ in range(min(10_000, PRO_COUNT - offset))]
+        pro_ids.extend(p["user_id"] for p in batch)
+        await db.pro_profiles.insert_many(batch)
+        # Opening balances, as open_ledgers writes for profiles that predate the ledger
+        await db.ledger_snapshots.insert_many([{
+            "pro_id": p["user_id"], "seq": 0, "weekly_budget": p["weekly_budget"],
+            "weekly_spent": p["weekly_spent"], "created_at": p["created_at"],
+        } for p in batch])
+    sample = rng.sample(pro_ids, min(len(pro_ids), 10_000))
+
+    done = asyncio.Event()
+    timings = []
+    charger = asyncio.create_task(charge_while_running(db, sample, done, timings))
+    start = time.perf_counter()
+    results = await reset_by_zone(db)
+    elapsed = time.perf_counter() - start
+    done.set()
+    await charger
+
+    timings.sort()
+    total = sum(count for count, _ in results.values())
+    print(f"pros={PRO_COUNT} reset={total} in {elapsed:.1f}s ({total / elapsed:,.0f} pros/s)")
+    print(f"{'zone':<22}{'pros':>10}{'seconds':>10}{'pros/s':>10}")
+    for zone, (count, seconds) in results.items():
+        print(f"{zone:<22}{count:>10}{seconds:>10.1f}{count / seconds:>10,.0f}")
+    if timings:
+        print(f"lead fee charges during reset: n={len(timings)} "
+              f"p50={statistics.median(timings):.2f}ms p99={timings[int(len(timings) * 0.99) - 1]:.2f}ms")
+    report = await verify_ledgers(db)
+    print(f"ledger verify: mismatches={report['mismatch_count']} gaps={report['gap_count']}")
+    if RESULTS_PATH:
+        Path(RESULTS_PATH).write_text(json.dumps({
+            "pros": PRO_COUNT,
+            "reset": total,
+            "seconds": round(elapsed, 2),
+            "pros_per_second": round(total / elapsed),
+            "zones": {zone: {"pros": count, "seconds": round(seconds, 2), "pros_per_second": round(count / seconds)}
+                      for zone, (count, seconds) in results.items()},
+            "charges_p50_ms": round(statistics.median(timings), 2) if timings else None,
+            "charges_p99_ms": round(timings[int(len(timings) * 0.99) - 1], 2) if timings else None,
+            "ledger_mismatches": report["mismatch_count"],
+            "ledger_gaps": report["gap_count"],
+        }, indent=2) + "\n")
+
+    for name in ("pro_profiles", "credit_ledger", "ledger_snapshots"):
+        await db[name].drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
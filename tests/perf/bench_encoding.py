@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compare the old response path for get_jobs and get_messages (stringify
+ObjectIds in a loop, then FastAPI's jsonable_encoder and JSONResponse) with
+the orjson path in backend/responses.py, at 1000 rows.
+
+Usage:
+    python tests/perf/bench_encoding.py
+"""
+
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+from models import JobStatus, ServiceCategory  # noqa: E402
+from responses import FastJSONResponse  # noqa: E402
+
+ROWS = 1000
+ITERATIONS = 50
+
+
+def make_jobs(with_object_id):
+    jobs = []
+    for i in range(ROWS):
+        job = {
+            "id": str(uuid.uuid4()),
+            "customer_id": str(uuid.uuid4()),
+            "customer_name": f"Customer {i}",
+            "customer_phone": "(555) 123-4567",
+            "title": f"Fix leaking kitchen sink #{i}",
+            "description": "The kitchen sink has been leaking under the cabinet. " * 4,
+            "category": ServiceCategory.PLUMBING,
+            "location": "Austin, TX",
+            "zipcode": "78701",
+            "images": [],
+            "budget_min": 100.0,
+            "budget_max": 300.0,
+            "timeline": "flexible",
+            "status": JobStatus.OPEN,
+            "created_at": datetime.utcnow() - timedelta(minutes=i),
+            "quotes_count": i % 5,
+        }
+        if with_object_id:
+            job["_id"] = ObjectId()
+        jobs.append(job)
+    return jobs
+
+
+def make_messages(with_object_id):
+    messages = []
+    for i in range(ROWS):
+        msg = {
+            "id": str(uuid.uuid4()),
+            "conversation_id": "job1_customer1_pro1",
+            "sender_id": "customer1" if i % 2 else "pro1",
+            "sender_name": "Customer" if i % 2 else "Pro",
+            "receiver_id": "pro1" if i % 2 else "customer1",
+            "message": "Can you come by on Tuesday morning to take a look?",
+            "read": False,
+            "created_at": datetime.utcnow() + timedelta(seconds=i),
+        }
+        if with_object_id:
+            msg["_id"] = ObjectId()
+        messages.append(msg)
+    return messages
+
+
+def old_path(docs):
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return JSONResponse(jsonable_encoder(docs)).body
+
+
+def new_path(docs):
+    return FastJSONResponse(docs).body
+
+
+def time_path(factory, path):
+    timings = []
+    for _ in range(ITERATIONS):
+        docs = factory()
+        start = time.perf_counter()
+        path(docs)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    print(f"{'endpoint':<14}{'path':<10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, factory in (("get_jobs", make_jobs), ("get_messages", make_messages)):
+        old = time_path(lambda: factory(True), old_path)
+        new = time_path(lambda: factory(False), new_path)
+        print(f"{name:<14}{'old':<10}{old[0]:>10.2f}{old[1]:>10.2f}")
+        print(f"{name:<14}{'orjson':<10}{new[0]:>10.2f}{new[1]:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
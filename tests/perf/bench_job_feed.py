@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pro job feed (GET /api/jobs?status=open) and pro search
+(GET /api/pros/search) with and without their summary projections. Seeds
+synthetic jobs and pro profiles into a scratch database and reports payload
+size and query latency for the detail (old) and summary (new) responses.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python tests/perf/bench_job_feed.py
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+from projections import JOB_SUMMARY_PROJECTION, PRO_SUMMARY_PROJECTION  # noqa: E402
+from thumbnails import make_thumbnail  # noqa: E402
+
+JOB_COUNT = int(os.environ.get("BENCH_JOBS", 1000))
+PRO_COUNT = int(os.environ.get("BENCH_PROS", 1000))
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 200))
+
+
+def make_photo():
+    """A 1280x960 JPEG of about 60KB base64, like a phone photo after client-side resize"""
+    noise = Image.effect_noise((1280, 960), 64).filter(ImageFilter.GaussianBlur(3))
+    out = io.BytesIO()
+    noise.convert("RGB").save(out, "JPEG", quality=40)
+    return "data:image/jpeg;base64," + base64.b64encode(out.getvalue()).decode()
+
+
+PHOTO = make_photo()
+THUMBNAIL = make_thumbnail(PHOTO)
+
+
+def make_job(i):
+    return {
+        "id": str(uuid.uuid4()),
+        "customer_id": str(uuid.uuid4()),
+        "customer_name": f"Customer {i}",
+        "customer_phone": "(555) 123-4567",
+        "title": f"Fix leaking kitchen sink #{i}",
+        "description": "The kitchen sink has been leaking under the cabinet for a week. " * 15,
+        "category": "plumbing",
+        "location": "Austin, TX",
+        "zipcode": "78701",
+        "images": [PHOTO] * (i % 4),
+        "thumbnail": THUMBNAIL if i % 4 else None,
+        "budget_min": 100.0,
+        "budget_max": 300.0,
+        "timeline": "flexible",
+        "status": "open",
+        "created_at": datetime.utcnow() - timedelta(minutes=i),
+        "quotes_count": i % 5,
+    }
+
+
+def make_pro(i):
+    return {
+        "user_id": str(uuid.uuid4()),
+        "bio": "Licensed plumber serving the metro area for over a decade. " * 10,
+        "services": ["plumbing", "handyman"],
+        "service_areas": ["78701", "78702"],
+        "hourly_rate": 85.0,
+        "years_experience": 12,
+        "profile_image": PHOTO,
+        "logo_image": THUMBNAIL,
+        "portfolio_images": [PHOTO] * (i % 5),
+        "certifications": ["Master Plumber"],
+        "background_check_verified": i % 2 == 0,
+        "weekly_budget": 200.0,
+        "weekly_spent": 40.0,
+        "budget_active": True,
+        "rating": 4.5,
+        "total_jobs": i % 40,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def job_feed(collection, projection):
+    return collection.find({"status": "open"}, projection).sort("created_at", -1)
+
+
+def pro_search(collection, projection):
+    return collection.find({"services": "plumbing"}, projection)
+
+
+async def measure(collection, query, projection):
+    timings = []
+    size = 0
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        rows = await query(collection, projection).to_list(100)
+        timings.append((time.perf_counter() - start) * 1000)
+        for row in rows:
+            row.pop("_id", None)
+        size = len(json.dumps(rows, default=str))
+    timings.sort()
+    return {
+        "payload_bytes": size,
+        "p50_ms": round(statistics.median(timings), 2),
+        "p99_ms": round(timings[int(len(timings) * 0.99) - 1], 2),
+    }
+
+
+async def main():
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("BENCH_DB_NAME", "qozii_bench")]
+    await db.jobs.drop()
+    await db.pro_profiles.drop()
+    await db.jobs.insert_many([make_job(i) for i in range(JOB_COUNT)])
+    await db.jobs.create_index([("status", 1), ("created_at", -1)])
+    for offset in range(0, PRO_COUNT, 100):
+        await db.pro_profiles.insert_many([make_pro(i) for i in range(offset, min(offset + 100, PRO_COUNT))])
+    await db.pro_profiles.create_index("services")
+
+    print(f"{'endpoint':<18}{'view':<10}{'payload':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for endpoint, collection, query, summary in (
+        ("/api/jobs", db.jobs, job_feed, JOB_SUMMARY_PROJECTION),
+        ("/api/pros/search", db.pro_profiles, pro_search, PRO_SUMMARY_PROJECTION),
+    ):
+        for name, projection in (("detail", None), ("summary", summary)):
+            result = await measure(collection, query, projection)
+            print(f"{endpoint:<18}{name:<10}{result['payload_bytes']:>12}"
+                  f"{result['p50_ms']:>10}{result['p99_ms']:>10}")
+
+    await db.jobs.drop()
+    await db.pro_profiles.drop()
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
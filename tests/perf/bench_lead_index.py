@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark the in-memory lead index: build it for 100k synthetic pros and
+time "who should see this job" lookups, plus single-pro updates.
+
+Usage:
+    python tests/perf/bench_lead_index.py
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+from lead_index import LeadIndex  # noqa: E402
+from models import ServiceCategory  # noqa: E402
+
+PROS = int(os.environ.get("BENCH_PROS", 100_000))
+LOOKUPS = int(os.environ.get("BENCH_LOOKUPS", 10_000))
+CITIES = [(f"City{i}", f"ST{i % 50}", f"{10000 + i:05d}") for i in range(2000)]
+CATEGORIES = [c.value for c in ServiceCategory]
+
+
+def make_profile(rng, i):
+    areas = []
+    for city, state, zipcode in rng.sample(CITIES, rng.randint(1, 5)):
+        areas.append(rng.choice([f"{city}, {state}", city, zipcode]))
+    return {
+        "user_id": f"pro-{i}",
+        "services": rng.sample(CATEGORIES, rng.randint(1, 3)),
+        "service_areas": areas,
+        "rating": rng.uniform(3, 5),
+        "weekly_budget": rng.choice([0, 50, 100, 200, 500]),
+        "weekly_spent": rng.choice([0, 10, 40]),
+        "budget_active": rng.random() > 0.1,
+        "last_active_at": datetime.utcnow() - timedelta(days=rng.uniform(0, 60)),
+    }
+
+
+def percentiles(samples):
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    rng = random.Random(42)
+    profiles = [make_profile(rng, i) for i in range(PROS)]
+
+    index = LeadIndex()
+    start = time.perf_counter()
+    for profile in profiles:
+        index.upsert(profile)
+    build_s = time.perf_counter() - start
+
+    jobs = []
+    for _ in range(LOOKUPS):
+        city, state, zipcode = rng.choice(CITIES)
+        jobs.append({"category": rng.choice(CATEGORIES), "location": f"{city}, {state}", "zipcode": zipcode})
+
+    match_us, candidates = [], []
+    for job in jobs:
+        start = time.perf_counter()
+        result = index.match(job, 10.0, limit=20)
+        match_us.append((time.perf_counter() - start) * 1e6)
+        candidates.append(len(result))
+
+    update_us = []
+    for _ in range(LOOKUPS):
+        profile = dict(rng.choice(profiles))
+        profile["weekly_spent"] += 10
+        start = time.perf_counter()
+        index.upsert(profile)
+        update_us.append((time.perf_counter() - start) * 1e6)
+
+    print(f"pros={PROS} postings={index.stats()['postings']} build={build_s:.2f}s")
+    p50, p99 = percentiles(match_us)
+    print(f"match top-20:  p50={p50:.1f}us p99={p99:.1f}us avg results={statistics.mean(candidates):.1f}")
+    p50, p99 = percentiles(update_us)
+    print(f"profile update: p50={p50:.1f}us p99={p99:.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Load test: scripted customer, pro and admin users drive the API for a fixed
+time and the run reports throughput and p50/p99 latency per route. With a
+stored baseline, the run fails (exit 1) when a route got slower or overall
+throughput dropped by more than the tolerance. With --require-baseline a
+missing baseline is a failure too, so a gate built on this run cannot pass
+by never comparing anything.
+
+By default the app runs in-process (httpx ASGITransport, startup handlers
+included) against a scratch database on a local mongod, which is dropped
+first so runs are comparable. --url drives a running server instead, e.g.
+one started with `uvicorn server:app --port 8001` from backend/; that
+server uses whatever database it was configured with.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python tests/perf/bench_load.py --update-baseline
+    MONGO_URL=mongodb://localhost:27017 python tests/perf/bench_load.py
+    MONGO_URL=mongodb://localhost:27017 python tests/perf/bench_load.py --require-baseline
+    LOAD_ADMIN_EMAIL=... LOAD_ADMIN_PASSWORD=... python tests/perf/bench_load.py --url http://127.0.0.1:8001
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parents[2] / "backend"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "load.json"
+
+# Admins cannot self-register; in-process runs create this account, --url
+# runs need it to exist on the server
+ADMIN_EMAIL = os.environ.get("LOAD_ADMIN_EMAIL", "load-admin@example.com")
+ADMIN_PASSWORD = os.environ.get("LOAD_ADMIN_PASSWORD", "load-test-password")
+
+CATEGORIES = ["plumbing", "electrical", "handyman"]
+LOCATION = "Austin, TX"
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+class Stats:
+    """Latencies per "METHOD /route/{template}", recorded only after warmup"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    def record(self, route: str, elapsed_ms: float, status: int):
+        if not self.recording:
+            return
+        self.latencies[route].append(elapsed_ms)
+        if status >= 400:
+            self.errors[route] += 1
+
+    def summary(self, seconds: float) -> Dict:
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values.sort()
+            routes[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "rps": round(len(values) / seconds, 2),
+                "p50_ms": round(percentile(values, 0.5), 2),
+                "p99_ms": round(percentile(values, 0.99), 2),
+                "max_ms": round(values[-1], 2),
+            }
+        total = sum(r["requests"] for r in routes.values())
+        return {
+            "seconds": round(seconds, 1),
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "rps": round(total / seconds, 2),
+            "routes": routes,
+        }
+
+
+class User:
+    """One virtual user: an HTTP client, an identity and a think time"""
+
+    def __init__(self, http: httpx.AsyncClient, stats: Stats, think: float):
+        self.http = http
+        self.stats = stats
+        self.think = think
+        self.id: Optional[str] = None
+        self.headers: Dict[str, str] = {}
+
+    async def call(self, method: str, route: str, params: Optional[Dict] = None,
+                   json: Optional[Dict] = None, **path) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.http.request(
+            method, route.format(**path), params=params, json=json, headers=self.headers
+        )
+        self.stats.record(f"{method} {route}", (time.perf_counter() - start) * 1000, response.status_code)
+        # Always yield, so in-process users that never wait on I/O cannot starve the clock
+        await asyncio.sleep(random.uniform(0, 2 * self.think) if self.think else 0)
+        return response
+
+    async def register(self, role: str, run_id: str):
+        response = await self.call("POST", "/api/users/register", json={
+            "email": f"{role}-{uuid.uuid4().hex[:12]}@{run_id}.example.com",
+            "password": "load-test-password",
+            "name": f"Load {role}",
+            "phone": "555-0100",
+            "role": role,
+        })
+        response.raise_for_status()
+        self.sign_in(response.json())
+
+    async def admin_login(self):
+        response = await self.call("POST", "/api/admin/login", params={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        response.raise_for_status()
+        self.sign_in(response.json())
+
+    def sign_in(self, body: Dict):
+        self.id = body["user"]["id"]
+        self.headers = {"Authorization": f"Bearer {body['access_token']}"}
+
+
+async def customer(user: User, run_id: str, stop: asyncio.Event):
+    await user.register("customer", run_id)
+    jobs: List[str] = []
+    while not stop.is_set():
+        category = random.choice(CATEGORIES)
+        response = await user.call("POST", "/api/jobs", params={"customer_id": user.id}, json={
+            "title": f"Load test {category} job",
+            "description": "Needs doing this week. " * 10,
+            "category": category,
+            "location": LOCATION,
+            "zipcode": "78701",
+            "budget_min": 100.0,
+            "budget_max": 400.0,
+            "timeline": "flexible",
+        })
+        if response.status_code == 200:
+            jobs.append(response.json()["job"]["id"])
+        await user.call("GET", "/api/categories")
+        await user.call("GET", "/api/pros/search", params={"category": category, "location": "Austin"})
+        await user.call("GET", "/api/jobs", params={"customer_id": user.id})
+        if not jobs:
+            continue
+        job_id = random.choice(jobs)
+        await user.call("GET", "/api/jobs/{job_id}", job_id=job_id)
+        quotes = await user.call("GET", "/api/quotes", params={"job_id": job_id, "sort": "best"})
+        if quotes.status_code == 200 and quotes.json():
+            pro_id = quotes.json()[0]["pro_id"]
+            conversation_id = f"{job_id}_{user.id}_{pro_id}"
+            await user.call("POST", "/api/messages", json={
+                "conversation_id": conversation_id, "sender_id": user.id,
+                "receiver_id": pro_id, "message": "When can you start?",
+            })
+            await user.call("GET", "/api/messages/{conversation_id}", conversation_id=conversation_id)
+        await user.call("GET", "/api/conversations/{user_id}", user_id=user.id)
+        await user.call("GET", "/api/conversations/{user_id}/unread", user_id=user.id)
+
+
+async def pro(user: User, run_id: str, stop: asyncio.Event):
+    await user.register("pro", run_id)
+    await user.call("PUT", "/api/pros/{user_id}/profile", user_id=user.id, json={
+        "services": CATEGORIES, "service_areas": [LOCATION],
+    })
+    # Enough budget that lead fees never run out during a run
+    await user.call("PUT", "/api/pros/{pro_id}/budget", params={"budget": 1_000_000}, pro_id=user.id)
+    quoted = set()
+    while not stop.is_set():
+        feed = await user.call("GET", "/api/jobs", params={"status": "open", "category": random.choice(CATEGORIES)})
+        open_jobs = [job["id"] for job in feed.json()] if feed.status_code == 200 else []
+        fresh = [job_id for job_id in open_jobs if job_id not in quoted]
+        if fresh:
+            job_id = random.choice(fresh)
+            quoted.add(job_id)
+            await user.call("POST", "/api/quotes", params={"pro_id": user.id}, json={
+                "job_id": job_id, "message": "Happy to help", "price": random.randint(100, 400),
+                "estimated_duration": random.choice(["2 hours", "1 day", "2-3 days"]),
+            })
+        await user.call("GET", "/api/quotes", params={"pro_id": user.id})
+        await user.call("GET", "/api/pros/{user_id}/profile", user_id=user.id)
+        await user.call("GET", "/api/pros/{pro_id}/ledger", pro_id=user.id)
+        await user.call("GET", "/api/conversations/{user_id}/unread", user_id=user.id)
+        await user.call("GET", "/api/payments/packages")
+
+
+async def admin(user: User, run_id: str, stop: asyncio.Event):
+    await user.admin_login()
+    while not stop.is_set():
+        await user.call("GET", "/api/admin/analytics")
+        await user.call("GET", "/api/admin/users", params={"role": "pro"})
+        await user.call("GET", "/api/admin/revenue")
+        await user.call("GET", "/api/admin/payments/stats")
+        await user.call("GET", "/api/admin/payments/transactions")
+        await user.call("GET", "/api/admin/categories")
+
+
+SCENARIOS = {"customer": customer, "pro": pro, "admin": admin}
+
+
+async def run(http: httpx.AsyncClient, args) -> Dict:
+    stats = Stats()
+    stop = asyncio.Event()
+    run_id = uuid.uuid4().hex[:8]
+    users = [
+        SCENARIOS[name](User(http, stats, args.think), run_id, stop)
+        for name, count in (("customer", args.customers), ("pro", args.pros), ("admin", args.admins))
+        for _ in range(count)
+    ]
+    tasks = [asyncio.create_task(user) for user in users]
+    await asyncio.sleep(args.warmup)
+    stats.recording = True
+    start = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stats.recording = False
+    elapsed = time.perf_counter() - start
+    stop.set()
+    # Let every user finish its current step, then surface setup failures
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            raise result
+    return stats.summary(elapsed)
+
+
+async def run_in_process(args) -> Dict:
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ["DB_NAME"] = args.db_name
+    # Neither access logs nor throttled registrations are what is being measured
+    os.environ.setdefault("ACCESS_LOG", "false")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from pymongo import MongoClient
+
+    mongo = MongoClient(os.environ["MONGO_URL"])
+    mongo.drop_database(args.db_name)
+    sys.path.insert(0, str(BACKEND))
+    import passwords
+    import server
+
+    mongo[args.db_name].users.insert_one({
+        "id": str(uuid.uuid4()), "email": ADMIN_EMAIL, "password": passwords._hash_sync(ADMIN_PASSWORD),
+        "name": "Load admin", "phone": "555-0100", "role": "admin", "is_active": True,
+        "created_at": datetime.utcnow(),
+    })
+    mongo.close()
+
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=60) as http:
+            return await run(http, args)
+    finally:
+        await server.app.router.shutdown()
+
+
+def compare(result: Dict, baseline: Dict, args) -> List[str]:
+    """Regressions against baseline, as human-readable lines"""
+    regressions = []
+    for route, base in baseline["routes"].items():
+        now = result["routes"].get(route)
+        if now is None:
+            continue
+        for key, tolerance in (("p50_ms", args.tolerance), ("p99_ms", args.p99_tolerance)):
+            limit = base[key] * (1 + tolerance) + args.slack_ms
+            if now[key] > limit:
+                regressions.append(f"{route}: {key} {now[key]} > {limit:.2f} (baseline {base[key]})")
+    min_rps = baseline["rps"] * (1 - args.tolerance)
+    if result["rps"] < min_rps:
+        regressions.append(f"throughput {result['rps']} req/s < {min_rps:.2f} (baseline {baseline['rps']})")
+    return regressions
+
+
+def print_report(result: Dict, baseline: Optional[Dict]):
+    base_routes = baseline["routes"] if baseline else {}
+    print(f"{'route':<48}{'req':>7}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'base p99':>10}")
+    for route, r in result["routes"].items():
+        base = base_routes.get(route, {}).get("p99_ms", "-")
+        print(f"{route:<48}{r['requests']:>7}{r['errors']:>5}{r['rps']:>9}{r['p50_ms']:>9}{r['p99_ms']:>9}{base:>10}")
+    print(f"total {result['requests']} requests, {result['errors']} errors, "
+          f"{result['rps']} req/s over {result['seconds']}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="drive a running server instead of the app in-process")
+    parser.add_argument("--db-name", default=os.environ.get("LOAD_DB_NAME", "qozii_load"),
+                        help="scratch database for in-process runs (dropped first)")
+    parser.add_argument("--customers", type=int, default=10)
+    parser.add_argument("--pros", type=int, default=10)
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between a user's requests")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--require-baseline", action="store_true", help="fail when there is no baseline to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 and throughput change")
+    parser.add_argument("--p99-tolerance", type=float, default=0.5, help="allowed p99 change")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="absolute slack for fast routes")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    args = parser.parse_args()
+    if args.require_baseline and not args.update_baseline and not args.baseline.exists():
+        # Fail before spending the run; without a baseline nothing can regress
+        sys.exit(f"no baseline at {args.baseline}; run with --update-baseline to store one")
+
+    if args.url:
+        async def against_url():
+            async with httpx.AsyncClient(base_url=args.url, timeout=60) as http:
+                return await run(http, args)
+        result = asyncio.run(against_url())
+    else:
+        result = asyncio.run(run_in_process(args))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    print_report(result, baseline)
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2))
+
+    failures = []
+    if result["requests"] and result["errors"] / result["requests"] > args.max_error_rate:
+        failures.append(f"error rate {result['errors'] / result['requests']:.1%} > {args.max_error_rate:.1%}")
+    if args.update_baseline:
+        if failures:
+            sys.exit("\n".join(["not storing a failing run as the baseline:"] + failures))
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(result, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to store one")
+    else:
+        failures += compare(result, baseline, args)
+    if failures:
+        print("REGRESSION" if baseline else "FAILED")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Time a logger.info call on the request path with the old setup
+(logging.basicConfig stream handler and an f-string) against the queued
+JSON setup in backend/logging_config.py (lazy %-args, written by a
+background thread). Both write to a sink that blocks for SINK_WRITE_US per
+write, like a stdout pipe to a busy log collector. Calls are spaced out
+like requests, and only the time inside the logging call is counted.
+
+Usage:
+    python tests/perf/bench_logging.py
+"""
+
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+import logging_config  # noqa: E402
+
+CALLS = 5_000
+SINK_WRITE_US = 50
+CALL_SPACING_SECONDS = 0.0002
+PACKAGES = {
+    "starter": {"amount": 50.0, "credits": 50.0, "description": "5 leads ($10 each)"},
+    "basic": {"amount": 100.0, "credits": 100.0, "description": "10 leads ($10 each)"},
+    "pro": {"amount": 200.0, "credits": 200.0, "description": "20 leads ($10 each)"},
+    "premium": {"amount": 500.0, "credits": 500.0, "description": "50 leads ($10 each)"},
+}
+
+
+class SlowSink:
+    def write(self, text):
+        time.sleep(SINK_WRITE_US / 1e6)
+
+    def flush(self):
+        pass
+
+
+def time_calls(log):
+    timings = []
+    for i in range(CALLS):
+        start = time.perf_counter()
+        log(i)
+        timings.append((time.perf_counter() - start) * 1e6)
+        time.sleep(CALL_SPACING_SECONDS)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    logger = logging.getLogger("bench")
+    root = logging.getLogger()
+
+    root.handlers = [logging.StreamHandler(SlowSink())]
+    root.setLevel(logging.INFO)
+    results = {
+        "basicConfig + f-string": time_calls(
+            lambda i: logger.info(f"Quote created: quote-{i} by pro pro-{i}, charged $10.0")),
+        "basicConfig + f-string of packages": time_calls(
+            lambda i: logger.info(f"Payment packages endpoint called, returning: {PACKAGES}")),
+    }
+
+    sys.stdout, real_stdout = SlowSink(), sys.stdout
+    logging_config.configure_logging()
+    results["queued JSON + lazy args"] = time_calls(lambda i: logger.info(
+        "Quote created: %s by pro %s, charged $%s", f"quote-{i}", f"pro-{i}", 10.0,
+        extra={"quote_id": f"quote-{i}", "pro_id": f"pro-{i}", "lead_fee": 10.0}
+    ))
+    dropped = logging_config.dropped_records()
+    logging_config.stop_logging()
+    sys.stdout = real_stdout
+
+    for name, (p50, p99) in results.items():
+        print(f"{name:<36} p50={p50:6.2f}us p99={p99:6.2f}us")
+    print(f"records dropped on a full queue: {dropped}")
+
+
+if __name__ == "__main__":
+    main()
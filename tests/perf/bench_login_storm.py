@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark: fires a burst of password verifications at an
+in-process ASGI app while probing an unrelated endpoint, once with bcrypt
+called inline on the event loop (the old behaviour) and once through the
+bounded bcrypt executor in backend/passwords.py.
+
+Reports login throughput and p50/p99 latency of the unrelated endpoint.
+
+Usage:
+    python tests/perf/bench_login_storm.py
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+import passwords  # noqa: E402
+
+LOGINS = int(os.environ.get("BENCH_LOGINS", 40))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", 20))
+PROBE_INTERVAL = 0.01
+
+HASHED = passwords._hash_sync("correct horse battery staple")
+
+app = FastAPI()
+
+
+@app.post("/login/inline")
+async def login_inline():
+    return {"ok": passwords._verify_sync("correct horse battery staple", HASHED)}
+
+
+@app.post("/login/executor")
+async def login_executor():
+    return {"ok": await passwords.verify_password("correct horse battery staple", HASHED)}
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+async def run(mode):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        done = asyncio.Event()
+        probe_latencies = []
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await http.get("/ping")
+                probe_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(PROBE_INTERVAL)
+
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def login():
+            async with semaphore:
+                await http.post(f"/login/{mode}")
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(LOGINS)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    probe_latencies.sort()
+    return {
+        "logins_per_s": round(LOGINS / elapsed, 1),
+        "probe_p50_ms": round(statistics.median(probe_latencies), 2),
+        "probe_p99_ms": round(probe_latencies[max(0, int(len(probe_latencies) * 0.99) - 1)], 2),
+        "probes": len(probe_latencies),
+    }
+
+
+async def main():
+    print(f"bcrypt rounds={passwords.BCRYPT_ROUNDS} workers={passwords.BCRYPT_WORKERS} logins={LOGINS}")
+    print(f"{'mode':<10}{'logins/s':>10}{'ping p50':>10}{'ping p99':>10}{'probes':>8}")
+    for mode in ("inline", "executor"):
+        result = await run(mode)
+        print(f"{mode:<10}{result['logins_per_s']:>10}{result['probe_p50_ms']:>10}"
+              f"{result['probe_p99_ms']:>10}{result['probes']:>8}")
+    passwords.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
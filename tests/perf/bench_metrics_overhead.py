@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Measure the per-request cost of MetricsMiddleware by driving a minimal
+FastAPI app directly over ASGI, with and without the middleware, and print
+a sample of the resulting /metrics output.
+
+Usage:
+    python tests/perf/bench_metrics_overhead.py
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from fastapi import FastAPI
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "backend"))
+from metrics import MetricsMiddleware, render_metrics  # noqa: E402
+
+REQUESTS = 20_000
+ROUNDS = 5
+
+
+def make_app(with_metrics):
+    app = FastAPI()
+
+    @app.get("/api/jobs/{job_id}")
+    async def get_job(job_id: str):
+        return {"id": job_id}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def drive(app, n):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(n):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": f"/api/jobs/{i}", "raw_path": f"/api/jobs/{i}".encode(),
+            "root_path": "", "query_string": b"", "headers": [], "server": ("test", 80), "client": ("127.0.0.1", 1),
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def main():
+    plain, metered = make_app(False), make_app(True)
+    await drive(plain, 1000)
+    await drive(metered, 1000)
+    base, with_metrics = [], []
+    for _ in range(ROUNDS):
+        base.append(await drive(plain, REQUESTS))
+        with_metrics.append(await drive(metered, REQUESTS))
+    b, m = statistics.median(base), statistics.median(with_metrics)
+    print(f"per request: without={b:.1f}us with={m:.1f}us overhead={m - b:.1f}us")
+    print("\n".join(line for line in render_metrics({}, {}).splitlines() if "le=\"0.005\"" in line or "_count" in line))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
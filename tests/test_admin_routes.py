@@ -0,0 +1,40 @@
+"""
+Admin diagnostics endpoints expose balances, query plans and internal
+counters and can be expensive to serve, so only admin tokens may call them.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_admin_routes.py
+"""
+
+import pytest
+
+from auth import create_access_token
+
+ADMIN_ROUTES = [
+    "/api/admin/login-throttle",
+    "/api/admin/compression-stats",
+    "/api/admin/realtime-stats",
+    "/api/admin/ledger/verify",
+    "/api/admin/slow-queries",
+]
+
+
+def bearer(role: str):
+    token = create_access_token({"id": f"{role}-1", "role": role, "name": role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("path", ADMIN_ROUTES)
+def test_anonymous_caller_is_rejected(api, path):
+    assert api.get(path).status_code == 401
+
+
+@pytest.mark.parametrize("path", ADMIN_ROUTES)
+@pytest.mark.parametrize("role", ["customer", "pro"])
+def test_non_admin_caller_is_rejected(api, path, role):
+    assert api.get(path, headers=bearer(role)).status_code == 403
+
+
+@pytest.mark.parametrize("path", ADMIN_ROUTES)
+def test_admin_caller_is_served(api, path):
+    assert api.get(path, headers=bearer("admin")).status_code == 200
@@ -0,0 +1,109 @@
+"""
+Peak memory allocated while serving the big admin list endpoints, at
+production data scale, and the route grouping of tracemalloc diffs.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_allocations.py
+"""
+
+import asyncio
+import os
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from allocations import memory_snapshots
+from responses import FastJSONRoute
+
+ROWS = 10_000
+# Peak bytes a single request may allocate on top of what was live before it
+ALLOCATION_BUDGET_BYTES = int(os.environ.get("ALLOCATION_BUDGET_BYTES", 4 * 1024 * 1024))
+BUDGETS = {
+    "/api/admin/revenue": ALLOCATION_BUDGET_BYTES,
+    "/api/admin/analytics": ALLOCATION_BUDGET_BYTES,
+    "/api/admin/payments/stats": ALLOCATION_BUDGET_BYTES,
+}
+
+
+@pytest.fixture(scope="module")
+def payments(mongo):
+    now = datetime.utcnow()
+    batch = uuid.uuid4().hex
+    mongo.payments.insert_many([{
+        "id": str(uuid.uuid4()), "batch": batch, "pro_id": f"pro-{i % 50}", "job_id": f"job-{i}",
+        "amount": 10.0, "payment_type": "lead_fee" if i % 4 else "job_payment",
+        "status": "completed", "created_at": now - timedelta(hours=i),
+    } for i in range(ROWS)])
+    mongo.payment_transactions.insert_many([{
+        "id": str(uuid.uuid4()), "batch": batch, "session_id": f"cs_{batch}_{i}", "pro_id": f"pro-{i % 50}",
+        "package_id": "basic", "amount": 100.0, "credits": 100.0, "currency": "usd",
+        "payment_status": "paid", "status": "completed", "metadata": {"type": "lead_credits"},
+        "created_at": now - timedelta(hours=i), "updated_at": now,
+    } for i in range(ROWS)])
+    yield
+    mongo.payments.delete_many({"batch": batch})
+    mongo.payment_transactions.delete_many({"batch": batch})
+
+
+def peak_allocated(call) -> int:
+    """Peak traced bytes above the starting point while call() runs"""
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - start
+
+
+@pytest.mark.parametrize("path", sorted(BUDGETS))
+def test_big_list_endpoints_stay_within_allocation_budget(api, payments, path):
+    # Warm up caches and lazily imported modules before measuring
+    assert api.get(path).status_code == 200
+
+    responses = []
+    peak = peak_allocated(lambda: responses.append(api.get(path)))
+
+    assert responses[0].status_code == 200, responses[0].text
+    assert peak <= BUDGETS[path], (
+        f"GET {path} peaked at {peak / 1e6:.1f}MB with {ROWS} rows, budget {BUDGETS[path] / 1e6:.1f}MB"
+    )
+
+
+def test_snapshot_diff_groups_growth_by_route():
+    # Same router class as server.py, so handlers are wrapped like the real ones
+    app = FastAPI()
+    router = APIRouter(prefix="/api", route_class=FastJSONRoute)
+    retained = []
+
+    @router.get("/first")
+    async def first():
+        return {"ok": True}
+
+    @router.get("/leak")
+    async def leak():
+        retained.append([str(i) * 10 for i in range(20_000)])
+        return {"ok": True}
+
+    app.include_router(router)
+    client = TestClient(app)
+    try:
+        base = asyncio.run(memory_snapshots.take())
+        client.get("/api/first")
+        client.get("/api/leak")
+        diff = asyncio.run(memory_snapshots.diff(base["id"], None, app.routes))
+    finally:
+        memory_snapshots.stop()
+
+    top = diff["groups"][0]
+    assert top["where"] == "GET /api/leak"
+    assert top["size_diff"] > 1_000_000
+    assert top["count_diff"] >= 20_000
+    assert not any(group["where"] == "GET /api/first" and group["size_diff"] > 100_000
+                   for group in diff["groups"])
@@ -0,0 +1,62 @@
+"""
+Who may act as a user: anonymous callers, other users, admins,
+registration attempts for the admin role, and racing signups for one email.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_auth.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from auth import check_caller, create_access_token, verify_access_token
+
+
+def claims(user_id: str, role: str):
+    return verify_access_token(create_access_token({"id": user_id, "role": role, "name": user_id}))
+
+
+def test_anonymous_caller_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        check_caller(None, "customer-1")
+    assert error.value.status_code == 401
+
+
+def test_token_for_another_user_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        check_caller(claims("customer-2", "customer"), "customer-1")
+    assert error.value.status_code == 403
+
+
+def test_own_token_and_admin_token_pass():
+    check_caller(claims("customer-1", "customer"), "customer-1")
+    check_caller(claims("admin-1", "admin"), "customer-1")
+
+
+def test_admin_role_cannot_be_self_registered(api):
+    response = api.post("/api/users/register", json={
+        "email": "mallory@example.com", "password": "x", "name": "Mallory",
+        "phone": "555-0199", "role": "admin",
+    })
+    assert response.status_code == 403
+    assert "access_token" not in response.json()
+
+
+def test_concurrent_pro_signups_for_one_email_create_one_account(api, mongo):
+    email = "race@example.com"
+
+    def register(i):
+        return api.post("/api/users/register", json={
+            "email": email, "password": "pw", "name": f"Racer {i}", "phone": "555-0100", "role": "pro",
+        }).status_code
+
+    with ThreadPoolExecutor(8) as pool:
+        statuses = sorted(pool.map(register, range(8)))
+
+    # Losers see the duplicate email, never a write conflict surfacing as a 500
+    assert statuses == [200] + [400] * 7
+    user_ids = [u["id"] for u in mongo.users.find({"email": email})]
+    assert len(user_ids) == 1
+    assert mongo.pro_profiles.count_documents({"user_id": user_ids[0]}) == 1
@@ -0,0 +1,74 @@
+"""
+Database round trips per endpoint. Each list endpoint is seeded with
+PROS rows so a per-row lookup shows up as PROS extra calls instead of
+hiding behind a small fixture.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_db_calls.py
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+PROS = 20
+CUSTOMER_ID = "customer-1"
+JOB_ID = "job-1"
+CONVERSATION_ID = f"{JOB_ID}_{CUSTOMER_ID}_pro-0"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seed(mongo):
+    now = datetime.utcnow()
+    mongo.users.insert_many(
+        [{"id": CUSTOMER_ID, "email": "customer@example.com", "name": "Customer", "phone": "555-0100",
+          "role": "customer", "is_active": True, "created_at": now}]
+        + [{"id": f"pro-{i}", "email": f"pro{i}@example.com", "name": f"Pro {i}", "phone": "555-0101",
+            "role": "pro", "is_active": True, "created_at": now} for i in range(PROS)]
+    )
+    mongo.pro_profiles.insert_many([{
+        "user_id": f"pro-{i}", "services": ["plumbing"], "service_areas": ["Austin, TX"],
+        "weekly_budget": 100.0, "weekly_spent": 0.0, "ledger_seq": 0, "budget_active": True,
+        "rating": 4.5, "total_jobs": 3, "portfolio_images": [], "created_at": now,
+    } for i in range(PROS)])
+    mongo.jobs.insert_one({
+        "id": JOB_ID, "customer_id": CUSTOMER_ID, "customer_name": "Customer", "title": "Leaking sink",
+        "description": "Kitchen sink leaks", "category": "plumbing", "location": "Austin, TX",
+        "zipcode": "78701", "images": [], "budget_min": 100.0, "budget_max": 300.0,
+        "timeline": "flexible", "status": "open", "quotes_count": PROS, "created_at": now,
+    })
+    mongo.quotes.insert_many([{
+        "id": str(uuid.uuid4()), "job_id": JOB_ID, "pro_id": f"pro-{i}", "pro_name": f"Pro {i}",
+        "pro_phone": "555-0101", "pro_rating": 4.5, "message": "Can do", "price": 150.0 + i,
+        "estimated_duration": "2 hours", "status": "pending", "created_at": now,
+        "rank": {"score": 0.5, "hours": 2.0},
+    } for i in range(PROS)])
+    mongo.messages.insert_many([{
+        "id": str(uuid.uuid4()), "conversation_id": CONVERSATION_ID, "sender_id": "pro-0",
+        "sender_name": "Pro 0", "receiver_id": CUSTOMER_ID, "message": f"Message {i}", "read": False,
+        "created_at": now + timedelta(seconds=i),
+    } for i in range(PROS)])
+    mongo.payment_transactions.insert_many([{
+        "id": str(uuid.uuid4()), "session_id": f"cs_{i}", "pro_id": f"pro-{i}", "package_id": "starter",
+        "amount": 25.0, "credits": 25.0, "currency": "usd", "payment_status": "paid",
+        "status": "completed", "created_at": now, "updated_at": now,
+    } for i in range(PROS)])
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/api/pros/search?category=plumbing", 2),
+    ("/api/pros/search?category=plumbing&location=Austin", 2),
+    ("/api/admin/users", 2),
+    ("/api/admin/users?role=pro", 2),
+    ("/api/admin/payments/transactions", 2),
+    ("/api/jobs?status=open", 1),
+    (f"/api/jobs/{JOB_ID}", 1),
+    (f"/api/quotes?job_id={JOB_ID}&sort=best", 1),
+    (f"/api/messages/{CONVERSATION_ID}", 1),
+    (f"/api/conversations/{CUSTOMER_ID}", 1),
+    (f"/api/conversations/{CUSTOMER_ID}/unread", 1),
+    ("/api/pros/pro-0/profile", 1),
+])
+def test_list_endpoints_do_not_query_per_row(api, assert_db_calls, path, expected):
+    assert_db_calls(api.get(path), expected)
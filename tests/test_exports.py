@@ -0,0 +1,35 @@
+"""
+Admin exports carry every user's contact details and payment history, so
+only admin tokens may download them.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_exports.py
+"""
+
+import pytest
+
+from auth import create_access_token
+
+EXPORTS = ["users", "payments", "transactions"]
+
+
+def bearer(role: str):
+    token = create_access_token({"id": f"{role}-1", "role": role, "name": role})
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("collection", EXPORTS)
+def test_anonymous_export_is_rejected(api, collection):
+    assert api.get(f"/api/admin/export/{collection}").status_code == 401
+
+
+@pytest.mark.parametrize("collection", EXPORTS)
+@pytest.mark.parametrize("role", ["customer", "pro"])
+def test_non_admin_export_is_rejected(api, collection, role):
+    assert api.get(f"/api/admin/export/{collection}", headers=bearer(role)).status_code == 403
+
+
+@pytest.mark.parametrize("collection", EXPORTS)
+def test_admin_can_export(api, collection):
+    response = api.get(f"/api/admin/export/{collection}", headers=bearer("admin"))
+    assert response.status_code == 200
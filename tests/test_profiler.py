@@ -0,0 +1,80 @@
+"""
+Sampling profiler output, against a stand-in app so it runs without MongoDB.
+
+Usage:
+    python -m pytest tests/test_profiler.py
+"""
+
+import asyncio
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from auth import create_access_token
+from profiler import ProfilingMiddleware, profiler, sample_process
+
+
+def burn_cpu(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_process_profile_is_collapsed_stacks_of_busy_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=burn_cpu, args=(stop,), name="burner")
+    worker.start()
+    try:
+        counts = sample_process(0.3, 0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    burner = {stack: n for stack, n in counts.items() if stack.startswith("burner;")}
+    assert burner, counts
+    assert all("burn_cpu (test_profiler.py:" in stack for stack in burner)
+    # The sampler never records itself, and parked threads are left out by default
+    assert not any("sample_process" in stack for stack in counts)
+    assert not any(";wait (threading.py:" in stack for stack in counts)
+
+
+def make_app():
+    app = FastAPI()
+
+    def crunch():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+
+    @app.get("/work")
+    async def work():
+        crunch()
+        await asyncio.sleep(0.1)
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware)
+    return app
+
+
+def test_tagged_request_profile_covers_cpu_and_waiting():
+    client = TestClient(make_app())
+    admin = create_access_token({"id": "admin-1", "role": "admin", "name": "Admin"})
+
+    untagged = client.get("/work", headers={"Authorization": f"Bearer {admin}"})
+    assert "X-Profile-Id" not in untagged.headers
+
+    response = client.get("/work", headers={"Authorization": f"Bearer {admin}", "X-Profile": "1"})
+    profile = profiler.request_profile(response.headers["X-Profile-Id"])
+    stacks = dict(line.rsplit(" ", 1) for line in profile.splitlines())
+
+    assert all(stack.startswith("GET /work;__call__ (profiler.py:") for stack in stacks)
+    assert any(";work (test_profiler.py:" in s and ";crunch (test_profiler.py:" in s for s in stacks)
+    assert any(";sleep (tasks.py:" in s and s.endswith("[waiting]") for s in stacks)
+
+
+def test_non_admin_cannot_tag_requests():
+    client = TestClient(make_app())
+    pro = create_access_token({"id": "pro-1", "role": "pro", "name": "Pro"})
+    response = client.get("/work", headers={"Authorization": f"Bearer {pro}", "X-Profile": "1"})
+    assert "X-Profile-Id" not in response.headers
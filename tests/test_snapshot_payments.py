@@ -0,0 +1,54 @@
+"""
+Parquet snapshots of payments: batches with different fields present must
+still read back as one dataset.
+
+Usage:
+    python -m pytest tests/test_snapshot_payments.py
+"""
+
+from datetime import datetime, timezone
+
+import pandas as pd
+from bson import ObjectId
+
+from snapshot_payments import SCHEMAS, to_frame, write_batch
+
+
+def test_batches_with_different_fields_read_back_together(tmp_path):
+    snapshot_at = datetime(2025, 2, 1)
+    # job_id is empty in the first batch and a string in the second
+    write_batch(tmp_path, "payments", to_frame("payments", [{
+        "_id": ObjectId(), "id": "p1", "pro_id": "pro-1", "amount": 10, "job_id": None,
+        "payment_type": "lead_fee", "status": "completed", "created_at": datetime(2025, 1, 5),
+    }], snapshot_at), "run", 0)
+    write_batch(tmp_path, "payments", to_frame("payments", [{
+        "_id": ObjectId(), "id": "p2", "pro_id": "pro-2", "amount": 12.5, "job_id": "j1",
+        "payment_type": "lead_fee", "status": "completed", "created_at": datetime(2025, 1, 9),
+    }], snapshot_at), "run", 1)
+
+    df = pd.read_parquet(tmp_path / "payments").sort_values("id")
+    assert df["job_id"].isna().tolist() == [True, False]
+    assert df["job_id"].iloc[1] == "j1"
+    assert list(df["amount"]) == [10.0, 12.5]
+
+
+def test_transactions_missing_optional_fields_share_the_schema(tmp_path):
+    snapshot_at = datetime(2025, 2, 1)
+    # A Stripe checkout, then background check charges with no session and
+    # an ISO string created_at
+    write_batch(tmp_path, "payment_transactions", to_frame("payment_transactions", [{
+        "_id": ObjectId(), "id": "t1", "session_id": "cs_1", "pro_id": "pro-1", "package_id": "basic",
+        "amount": 100, "credits": 100, "currency": "usd", "payment_status": "paid", "status": "completed",
+        "metadata": {"type": "lead_credits"}, "created_at": datetime(2025, 1, 5), "updated_at": datetime(2025, 1, 5),
+    }], snapshot_at), "run", 0)
+    write_batch(tmp_path, "payment_transactions", to_frame("payment_transactions", [{
+        "_id": ObjectId(), "pro_id": "pro-2", "amount": 35.0, "payment_type": "background_check",
+        "payment_method": "credits", "status": "completed",
+        "created_at": datetime(2025, 1, 7, tzinfo=timezone.utc).isoformat(),
+    }], snapshot_at), "run", 1)
+
+    df = pd.read_parquet(tmp_path / "payment_transactions").sort_values("amount")
+    assert set(SCHEMAS["payment_transactions"].names) <= set(df.columns)
+    assert df["payment_method"].iloc[0] == "credits" and pd.isna(df["payment_method"].iloc[1])
+    assert pd.isna(df["metadata"].iloc[0]) and df["metadata"].iloc[1] == '{"type": "lead_credits"}'
+    assert df["created_at"].dt.day.tolist() == [7, 5]
@@ -0,0 +1,58 @@
+"""
+In-memory login token buckets: refill, bounded cost under a flood of
+distinct keys, and occupancy on /metrics.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_throttle.py
+"""
+
+import time
+
+import throttle
+from throttle import TokenBucketSet
+
+
+def test_bucket_refuses_after_burst_and_refills():
+    buckets = TokenBucketSet(burst=2, rate=1)
+    assert buckets.take("1.2.3.4", now=0)
+    assert buckets.take("1.2.3.4", now=0)
+    assert not buckets.take("1.2.3.4", now=0.5)
+    assert buckets.take("1.2.3.4", now=1.5)
+
+
+def test_flood_of_new_keys_stays_capped_and_cheap(monkeypatch):
+    monkeypatch.setattr(throttle, "MAX_LOCAL_BUCKETS", 1000)
+    buckets = TokenBucketSet(burst=5, rate=5 / 60)
+    start = time.perf_counter()
+    # Nothing refills within the flood, so every new key hits the cap
+    for i in range(200_000):
+        buckets.take(f"attacker-{i}", now=i / 1e6)
+    elapsed = time.perf_counter() - start
+
+    assert len(buckets.buckets) <= 1000
+    # A full scan per insert would take minutes here
+    assert elapsed < 5
+
+
+def test_refilled_buckets_are_dropped_before_busy_ones():
+    buckets = TokenBucketSet(burst=1, rate=1)
+    buckets.take("idle", now=0)
+    buckets.take("busy", now=0)
+    buckets.take("busy", now=0.9)
+    buckets.take("new", now=1.5)
+    assert list(buckets.buckets) == ["busy", "new"]
+
+
+def gauge(metrics: str, name: str) -> float:
+    return next(float(line.split()[1]) for line in metrics.splitlines() if line.startswith(f"{name} "))
+
+
+def test_bucket_occupancy_is_exported_as_metrics(api):
+    email = f"victim-{time.time_ns()}@example.com"
+    for _ in range(int(throttle.LOGIN_EMAIL_BURST) + 1):
+        api.post("/api/users/login", params={"email": email, "password": "wrong"})
+
+    metrics = api.get("/metrics").text
+    assert gauge(metrics, "login_throttle_email_buckets_tracked") >= 1
+    assert gauge(metrics, "login_throttle_email_buckets_exhausted") >= 1
+    assert gauge(metrics, "login_throttle_ip_buckets_tracked") >= 1
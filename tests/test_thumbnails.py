@@ -0,0 +1,55 @@
+"""
+Job card thumbnails: size, orientation, and inputs that are not uploads.
+
+Usage:
+    python -m pytest tests/test_thumbnails.py
+"""
+
+import base64
+import io
+
+from PIL import Image
+
+from projections import job_summary
+from thumbnails import THUMBNAIL_SIZE, make_thumbnail
+
+
+def data_url(image: Image.Image, orientation: int = 1) -> str:
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    out = io.BytesIO()
+    image.save(out, "JPEG", exif=exif)
+    return "data:image/jpeg;base64," + base64.b64encode(out.getvalue()).decode()
+
+
+def decode(url: str) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1])))
+
+
+def test_upload_is_shrunk_to_thumbnail_size():
+    photo = data_url(Image.effect_noise((1600, 1200), 64).convert("RGB"))
+    thumbnail = make_thumbnail(photo)
+
+    assert thumbnail.startswith("data:image/jpeg;base64,")
+    assert decode(thumbnail).size == (THUMBNAIL_SIZE, THUMBNAIL_SIZE * 3 // 4)
+    assert len(thumbnail) < len(photo) / 10
+
+
+def test_exif_rotation_is_applied():
+    # Orientation 6: stored landscape, displayed portrait
+    thumbnail = make_thumbnail(data_url(Image.new("RGB", (800, 400)), orientation=6))
+    width, height = decode(thumbnail).size
+    assert height > width
+
+
+def test_urls_pass_through_and_garbage_is_dropped():
+    assert make_thumbnail("https://cdn.example.com/sink.jpg") == "https://cdn.example.com/sink.jpg"
+    assert make_thumbnail("data:image/jpeg;base64,not-base64!") is None
+    assert make_thumbnail("data:image/jpeg;base64," + base64.b64encode(b"not an image").decode()) is None
+
+
+def test_summary_card_carries_thumbnail_not_images():
+    card = job_summary({"id": "job-1", "images": ["a", "b"], "thumbnail": "t", "description": "x" * 500})
+    assert "images" not in card
+    assert card["thumbnail"] == "t"
+    assert card["image_count"] == 2
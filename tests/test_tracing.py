@@ -0,0 +1,50 @@
+"""
+Incoming W3C traceparent headers, well-formed and not.
+
+Usage:
+    python -m pytest tests/test_tracing.py
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def test_valid_traceparent_is_continued():
+    assert tracing._parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert tracing._parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00") == (TRACE_ID, PARENT_ID, False)
+
+
+@pytest.mark.parametrize("header", [
+    "",
+    "garbage",
+    f"00-{TRACE_ID}-{PARENT_ID}-zz",
+    f"00-{TRACE_ID}-{PARENT_ID}-",
+    f"00-{TRACE_ID}-{PARENT_ID}-1",
+    f"00-{TRACE_ID.upper()}-{PARENT_ID}-01",
+    f"00-{'0' * 32}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{'0' * 16}-01",
+    f"00-{TRACE_ID}-{'x' * 16}-01",
+    f"ff-{TRACE_ID}-{PARENT_ID}-01",
+    f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+])
+def test_malformed_traceparent_starts_a_new_trace(monkeypatch, header):
+    assert tracing._parse_traceparent(header) is None
+
+    monkeypatch.setattr(tracing, "TRACE_EXPORTER", "file")
+    monkeypatch.setattr(tracing.exporter, "add", lambda span: None)
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(tracing.TracingMiddleware)
+    response = TestClient(app).get("/ping", headers={"traceparent": header})
+    assert response.status_code == 200
+    assert response.headers["X-Trace-Id"] != TRACE_ID
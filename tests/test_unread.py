@@ -0,0 +1,54 @@
+"""
+Unread counters and mark-read for messages that share a timestamp.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python -m pytest tests/test_unread.py
+"""
+
+from datetime import datetime
+
+from auth import create_access_token
+
+RECEIVER = "unread-customer"
+SENDER = "unread-pro"
+CONVERSATION_ID = f"unread-job_{RECEIVER}_{SENDER}"
+
+
+def test_mark_read_up_to_splits_messages_with_the_same_timestamp(api, mongo):
+    now = datetime.utcnow().replace(microsecond=0)
+    mongo.messages.insert_many([{
+        "id": message_id, "conversation_id": CONVERSATION_ID, "sender_id": SENDER, "sender_name": "Pro",
+        "receiver_id": RECEIVER, "message": message_id, "read": False, "created_at": now,
+    } for message_id in ("m-a", "m-b", "m-c")])
+    mongo.unread_counters.insert_one({"user_id": RECEIVER, "conversation_id": CONVERSATION_ID, "unread": 3})
+    token = create_access_token({"id": RECEIVER, "role": "customer", "name": "Customer"})
+
+    response = api.post(
+        f"/api/conversations/{CONVERSATION_ID}/read",
+        params={"user_id": RECEIVER, "up_to": "m-b"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.json()["marked_read"] == 2
+    unread = [m["id"] for m in mongo.messages.find({"conversation_id": CONVERSATION_ID, "read": False})]
+    assert unread == ["m-c"]
+    counter = mongo.unread_counters.find_one({"user_id": RECEIVER, "conversation_id": CONVERSATION_ID})
+    assert counter["unread"] == 1
+
+
+def test_sent_message_is_counted_by_the_time_it_can_be_read(api, mongo):
+    token = create_access_token({"id": SENDER, "role": "pro", "name": "Pro"})
+    conversation_id = f"unread-job-2_{RECEIVER}_{SENDER}"
+    response = api.post("/api/messages", headers={"Authorization": f"Bearer {token}"}, json={
+        "conversation_id": conversation_id, "sender_id": SENDER, "receiver_id": RECEIVER, "message": "Hi",
+    })
+    assert response.status_code == 200
+
+    reader = create_access_token({"id": RECEIVER, "role": "customer", "name": "Customer"})
+    api.post(
+        f"/api/conversations/{conversation_id}/read",
+        params={"user_id": RECEIVER, "up_to": response.json()["message"]["id"]},
+        headers={"Authorization": f"Bearer {reader}"},
+    )
+    counter = mongo.unread_counters.find_one({"user_id": RECEIVER, "conversation_id": conversation_id})
+    assert counter["unread"] == 0